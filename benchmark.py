@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Time Todoian's loading, saving, displays and commands against large
+synthetic data files.
+
+Results are printed as JSON so runs against different versions can be
+compared:
+
+    python3 benchmark.py --sizes 10000 100000 > before.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import platform
+import tempfile
+from contextlib import redirect_stdout
+
+import todoian
+from todoian import Task, Goal, SubItem
+
+
+TAGS = ['work', 'home', 'urgent', 'errands', 'health', 'money', 'family', 'later']
+WORDS = ['call', 'email', 'buy', 'fix', 'book', 'pay', 'clean', 'plan', 'read',
+         'write', 'review', 'order', 'renew', 'water', 'walk', 'visit']
+REPEATS = ['', '', '', '', 1, 7, 14, '1m', '3m', 'mon', ['mon', 'thu'], ['sat', 'sun']]
+
+# Repeating Tasks completed one at a time by the complete_repeats benchmark
+COMPLETIONS = 1000
+
+
+def make_data(num_tasks, num_goals=200, seed=0):
+    """Return a sorted list of synthetic Tasks and a list of Goals, each with
+    repeats, Subitems and tags mixed in, along with the next free ID."""
+    rand = random.Random(seed)
+    ids = iter(range(1, sys.maxsize))
+    today = todoian.current_date
+
+    def subs():
+        return [SubItem(rand.choice(WORDS), rand.random() < 0.3, next(ids))
+                for _ in range(rand.choice((0, 0, 0, 1, 2, 3)))]
+
+    def tags():
+        return rand.sample(TAGS, rand.choice((0, 0, 1, 1, 2)))
+
+    tasks = []
+    for num in range(num_tasks):
+        desc = '{} {} {}'.format(rand.choice(WORDS), rand.choice(WORDS), num)
+        # A year either side of today so there is plenty overdue
+        due = today + rand.randint(-365, 365)
+        tasks.append(Task(desc, due, rand.choice(REPEATS), subs(), tags(), next(ids)))
+    tasks.sort(key=lambda task: task.due)
+
+    goals = [Goal('{} goal {}'.format(rand.choice(WORDS), num), '', 'auto',
+                  subs(), tags(), next(ids))
+             for num in range(num_goals)]
+    return tasks, goals, next(ids)
+
+
+def write_store(data_file, tasks, goals, next_id):
+    """Write a data file snapshot and search index for the synthetic data."""
+    with open(data_file, 'wb') as fp:
+        pickle.dump([], fp)
+        pickle.dump([], fp)
+    store = todoian.PickleStore(data_file)
+    store.load_data()
+    for data_list, items in ((store.task_data, tasks), (store.goal_data, goals)):
+        for item in items:
+            data_list.append(item)
+            store.index_item(item)
+    store.next_id = next_id
+    store.compact_journal()
+
+
+def timed(results, name, func, *args):
+    """Run a function with its output discarded, adding its time to results."""
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        value = func(*args)
+    results[name] = round(time.perf_counter() - start, 6)
+    return value
+
+
+def run_benchmarks(data_file):
+    """Time each operation against the data file, returning the timings in
+    seconds along with the size of the data file they leave behind."""
+    results = {}
+    store = todoian.PickleStore(data_file)
+    timed(results, 'load', store.load_data)
+    todoian.store = store
+    todoian.use_pager = False
+
+    timed(results, 'view_today', todoian.view_today)
+    timed(results, 'view_tomorrow', todoian.view_tomorrow)
+    timed(results, 'view_overdue', todoian.view_overdue)
+    timed(results, 'view_future', todoian.view_future)
+    timed(results, 'view_goals', todoian.view_goals, True)
+    timed(results, 'smart_display', todoian.smart_display)
+    timed(results, 'smart_display_mini', todoian.smart_display, True)
+    timed(results, 'tag_query', todoian.tag_query, 'work+urgent,home')
+    timed(results, 'view_specific_tag', todoian.view_specific_tag, 'tag urgent')
+    timed(results, 'view_search', todoian.view_search, 'call')
+
+    timed(results, 'add_task', todoian.add_task, '"benchmark task" 2030-01-01')
+    timed(results, 'save_changes', store.save_changes)
+
+    repeating = [task for task in store.task_data if task.repeat != '']
+    future = [task for task in repeating if task.due >= todoian.current_date]
+    sample = (future or repeating)[:COMPLETIONS]
+
+    def complete_each():
+        for task in sample:
+            todoian.complete_task(task, print_msg=False)
+
+    timed(results, 'complete_repeats', complete_each)
+    timed(results, 'complete_overdue', todoian.complete_overdue)
+    timed(results, 'save_after_commands', store.save_changes)
+    timed(results, 'compact_journal', store.compact_journal)
+    return {'timings': results, 'repeat_completions': len(sample),
+            'data_file_bytes': os.path.getsize(data_file)}
+
+
+def main():
+    """Run the benchmarks for each size of data file and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', metavar='N', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help="numbers of Tasks to benchmark (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed for the synthetic data (default: %(default)s)")
+    parser.add_argument('--output', metavar='FILE',
+                        help="write the results to FILE instead of stdout")
+    args = parser.parse_args()
+
+    runs = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = os.path.join(temp_dir, 'data.pickle')
+            start = time.perf_counter()
+            write_store(data_file, *make_data(size, seed=args.seed))
+            print("  Generated {} Tasks in {:.1f}s".format(size, time.perf_counter() - start),
+                  file=sys.stderr)
+            runs.append(dict(tasks=size, **run_benchmarks(data_file)))
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': todoian.format_date(todoian.current_date),
+        'seed': args.seed,
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Tests for Todoian's storage and import and export, run with
+python -m unittest from the repository root."""
+
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import todoian
+from todoian import Goal, Task
+
+
+class StoreTestCase(unittest.TestCase):
+    """Runs each test against a fresh data file in a temporary directory."""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.data_file = os.path.join(self.data_dir, 'data.pickle')
+        self.write_legacy([], [])
+        self.saved_store = todoian.store
+        self.addCleanup(setattr, todoian, 'store', self.saved_store)
+        self.open_store()
+
+    def write_legacy(self, tasks, goals):
+        """Write a data file the way versions before journaling did."""
+        with open(self.data_file, 'wb') as fp:
+            pickle.dump(tasks, fp)
+            pickle.dump(goals, fp)
+
+    def open_store(self):
+        """Point Todoian at the data file, as if started again."""
+        todoian.store = todoian.PickleStore(self.data_file)
+        return todoian.store
+
+    def run_quietly(self, function, *args):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            function(*args)
+        return output.getvalue()
+
+
+class LegacyDataTests(StoreTestCase):
+
+    def test_unsorted_legacy_file_is_sorted_on_load(self):
+        # Written by the version before journaling, whose undo appended
+        # restored Tasks to the end of the list
+        self.write_legacy([[1, 'soon', '2026-10-01', '', [], ['x']],
+                           [2, 'later', '2026-11-01', '', [], []],
+                           [3, 'restored', '2026-09-01', '', ['a^', 'b'], ['x']]], [])
+        store = self.open_store()
+        self.assertEqual([task.desc for task in store.task_data],
+                         ['restored', 'soon', 'later'])
+        self.assertEqual([task.due for task in store.task_data],
+                         sorted(task.due for task in store.task_data))
+        for position, task in enumerate(store.task_data):
+            self.assertEqual(store.item_position(task), position)
+
+        first, last = todoian.date_range(end=todoian.parse_date('2026-10-15'))
+        self.assertEqual([task.desc for task in store.task_data[first:last]],
+                         ['restored', 'soon'])
+        self.assertEqual(sorted(store.item_position(store.item_index[item_id])
+                                for item_id in store.tag_index['x']), [0, 1])
+
+        # The upgrade is saved, so the file loads sorted from now on
+        store = self.open_store()
+        self.assertEqual([task.desc for task in store.task_data],
+                         ['restored', 'soon', 'later'])
+
+    def test_legacy_monthly_repeat_keeps_its_day(self):
+        # Before repeats kept their day, one due on the 28th stayed on it
+        self.write_legacy([[1, 'rent', '2027-02-28', '1m', [], []]], [])
+        store = self.open_store()
+        self.run_quietly(todoian.complete_task, store.task_data[0])
+        task = store.task_data[0]
+        self.assertEqual((todoian.format_date(task.due), task.repeat),
+                         ('2027-03-28', '1m:28'))
+
+
+class MergeTests(StoreTestCase):
+
+    def add_task(self, store, desc, due, repeat=''):
+        todoian.store = store
+        task = Task(desc, due, repeat, item_id=store.new_id())
+        store.insert_task(task)
+        return task
+
+    def test_undo_follows_an_item_renumbered_by_a_merge(self):
+        today = todoian.current_date
+        this_session = todoian.PickleStore(self.data_file)
+        other_session = todoian.PickleStore(self.data_file)
+        # Both load the data before either saves
+        this_session.task_data, other_session.task_data
+        other_task = self.add_task(other_session, 'theirs', today + 10)
+        other_session.save_changes()
+
+        task = self.add_task(this_session, 'ours', today, 7)
+        self.run_quietly(todoian.complete_task, task)
+        finished = self.add_task(this_session, 'finished', today)
+        self.run_quietly(todoian.complete_task, finished)
+        self.assertEqual(task.id, other_task.id)
+        self.run_quietly(this_session.save_changes)
+
+        todoian.store = this_session
+        self.run_quietly(todoian.undo_action, 'completed-tasks')
+        self.run_quietly(todoian.undo_action, 'completed-tasks')
+        this_session.save_changes()
+        store = self.open_store()
+        self.assertEqual(sorted((task.desc, task.due) for task in store.task_data),
+                         [('finished', today), ('ours', today), ('theirs', today + 10)])
+        self.assertEqual(len(store.item_index), 3)
+        self.assertEqual(store.archive.month_items(todoian.format_date(today)[:7]), [])
+
+
+class SqliteQueryTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        todoian.store = todoian.SqliteStore(os.path.join(self.data_dir, 'data.db'))
+        self.addCleanup(lambda: todoian.store.connection.close())
+
+    def test_queries_match_the_lists(self):
+        store = todoian.store
+        today = todoian.current_date
+        for offset in (3, -2, 0, 1, 0, 5, -2, 1, 2):
+            tags = ['even'] if offset % 2 == 0 else ['odd', 'x']
+            store.insert_task(Task('due {}'.format(offset), today + offset, tags=tags,
+                                   item_id=store.new_id()))
+        store.set_due(store.task_data[0], today + 4)
+        todoian.complete_range(0, 2, today)
+        store.save_changes()
+
+        for start, end in ((None, today), (today, today + 1), (today + 2, None),
+                           (None, None)):
+            self.assertEqual(
+                [(position, task.id) for position, task in store.tasks_due(start, end)],
+                [(position, task.id) for position, task
+                 in todoian.Store.tasks_due(store, start, end)])
+        for tag in ('even', 'odd', 'x', 'missing'):
+            self.assertEqual(store.tagged_ids(tag), store.tag_index.get(tag, set()))
+
+
+class ExportImportTests(StoreTestCase):
+
+    def round_trip(self, export_name):
+        store = todoian.store
+        today = todoian.current_date
+        store.insert_task(Task('tagged', today, tags=['home'], item_id=store.new_id()))
+        store.insert_task(Task('untagged', today + 1, item_id=store.new_id()))
+        store.insert_task(Task('repeats', today + 2, 3, tags=['work', 'x'],
+                               item_id=store.new_id()))
+        store.insert_task(Task('plain', today + 3, item_id=store.new_id()))
+        store.insert_item(store.goal_data, 0, Goal('goal', 'soon', 'auto',
+                                                   item_id=store.new_id()))
+        export_file = os.path.join(self.data_dir, export_name)
+        self.run_quietly(todoian.export_data, export_file)
+
+        os.remove(self.data_file)
+        self.write_legacy([], [])
+        store = self.open_store()
+        output = self.run_quietly(todoian.import_data, export_file)
+        self.assertNotIn('Skipped', output)
+        self.assertEqual([(task.desc, list(task.tags)) for task in store.task_data],
+                         [('tagged', ['home']), ('untagged', []),
+                          ('repeats', ['work', 'x']), ('plain', [])])
+        self.assertEqual([goal.desc for goal in store.goal_data], ['goal'])
+
+    def test_csv_round_trip_keeps_untagged_rows(self):
+        self.round_trip('tasks.csv')
+
+    def test_jsonl_round_trip_keeps_untagged_rows(self):
+        self.round_trip('tasks.jsonl')
+
+    def test_invalid_percent_is_reported(self):
+        with self.assertRaisesRegex(ValueError, 'Percentage'):
+            todoian.import_record({'type': 'goal', 'desc': 'g', 'percent': '120'})
+
+    def test_non_text_tags_are_reported(self):
+        with self.assertRaisesRegex(ValueError, 'Tags'):
+            todoian.import_record({'type': 'task', 'desc': 't', 'tags': [1]})
+
+
+if __name__ == '__main__':
+    unittest.main()
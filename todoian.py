@@ -2,341 +2,478 @@
 
 """A Command Line Task Manager."""
 
+import io
+import os
 import re
+import sys
+import time
+import json
+import runpy
 import pickle
+import signal
+import asyncio
+import pstats
+import cProfile
+import csv
+import sqlite3
+import argparse
+import functools
+import subprocess
+import tracemalloc
+from array import array
+from calendar import monthrange
+from itertools import chain, count, islice
+from shutil import get_terminal_size
+from contextlib import contextmanager, redirect_stdout
+from bisect import bisect_left, bisect_right, insort
+from operator import attrgetter, itemgetter
 from datetime import datetime as dt
-from datetime import timedelta
+from heapq import merge
 
+try:
+    import fcntl
+except ImportError:
+    # Without it saves go unlocked, as they always have on Windows
+    fcntl = None
 
-def decide_action(command):
-    """Decide on the actions and function calls the command requires."""
-    command_regex = re.search(r'^([-\w]*)\s?(.*)', command)
-    command_main = command_regex.group(1).lower()
-    command_extra = command_regex.group(2).lower()
-
-    if command_main in ('ls','list'):
-        if command_extra in ('t', 'today'):
-            view_today()
-        elif command_extra in ('o', 'overdue'):
-            view_overdue()
-        elif command_extra in ('tm', 'tomorrow'):
-            view_tomorrow()
-        elif command_extra in ('f', 'future'):
-            view_tomorrow()
-            view_future()
-        elif command_extra in ('g', 'goals'):
-            view_goals()
-        elif command_extra in ('gs', 'goals-subs'):
-            view_goals(show_subs=True)
-        elif command_extra in ('a', 'all'):
-            view_goals()
-            smart_display()
-        elif command_extra.startswith('tg') or command_extra.startswith('tag'):
-            view_specific_tag(command_extra)
-        else:
-            smart_display(mini=True)
 
-    elif command_main in ('vg', 'view-goal'):
-        print()
-        view_goal(int(command_extra) - 1, subs=True)
+# RECORD CLASSES
 
-    elif command_main in ('a', 't' 'add'):
-        add_task(command_regex.group(2))
-        update_order()
-        smart_display()
+class Task:
+    """A Task along with its due date ordinal, repeat, Subtasks and tags."""
 
-    elif command_main in ('g', 'ag', 'add-goal'):
-        add_goal(command_regex.group(2))
-        update_order()
-        view_goals()
+    __slots__ = ('desc', 'due', 'repeat', 'subs', 'tags', 'id')
 
-    elif command_main in ('d', 'del', 'delete'):
-        if command_extra in ("all", 'a'):
-            check = input("  This Will Delete All Task Data. Are You Sure "
-                          "You Want to Continue? (y/n): ")
-            if check.lower() in ('y', 'yes'):
-                task_data.clear()
-            else:
-                print("  Removal of All Tasks Aborted.")
-        else:
-            delete_item(int(command_extra) - 1, deleted_tasks)
-            update_order()
-            smart_display()
-
-    elif command_main in ('dg', 'delg', 'delete-goal'):
-        if command_extra in ("all", 'a'):
-            check = input("  This Will Delete All Goal Data. Are You Sure "
-                          "You Want to Continue? (y/n): ")
-            if check.lower() in ('y', 'yes'):
-                goal_data.clear()
-            else:
-                print("  Removal of All Goals Aborted.")
-        else:
-            delete_item(int(command_extra) - 1, deleted_goals)
-            update_order()
-            view_goals()
-
-    elif command_main in ('c', 'complete'):
-        if command_extra in ('t', 'today'):
-            complete_today()
-        elif command_extra in ('o', 'overdue'):
-            complete_overdue()
-        else:
-            complete_task(int(command_extra) - 1)
-        update_order()
-        smart_display()
+    def __init__(self, desc, due, repeat='', subs=(), tags=(), item_id=None):
+        self.desc = desc
+        self.due = due
+        self.repeat = repeat
+        # Empty tuples are shared, so only items with Subitems or tags pay for a list
+        self.subs = subs
+        self.tags = tags
+        # IDs never change, unlike positions, so changes are journaled by ID
+        self.id = item_id
 
-    elif command_main in ('cg', 'complete-goal'):
-        complete_goal(int(command_extra) - 1)
-        update_order()
-        view_goals()
+    def __reduce__(self):
+        return (Task, (self.desc, self.due, self.repeat, self.subs, self.tags,
+                       self.id))
 
-    elif command_main in ('e', 'ed', 'edit'):
-        edit_desc(command_regex.group(2), task_data)
-        smart_display()
+    def copy(self):
+        """Return a copy of the Task."""
+        return Task(self.desc, self.due, self.repeat, self.subs, self.tags,
+                    self.id)
 
-    elif command_main in ('eg', 'edg', 'edit-goal'):
-        edit_desc(command_regex.group(2), goal_data)
-        view_goals()
 
-    elif command_main in ('cd', 'change-date'):
-        change_date(command_extra)
-        update_order()
-        smart_display()
+class Goal:
+    """A Goal along with its target, percentage, Subgoals and tags."""
 
-    elif command_main in ('ct', 'change-target'):
-        change_target(command_regex.group(2))
-        view_goals()
+    __slots__ = ('desc', 'target', 'percent', 'subs', 'tags', 'id')
 
-    elif command_main in ('cp', 'change-percentage'):
-        change_percentage(command_extra)
-        view_goals()
+    def __init__(self, desc, target='', percent='auto', subs=(), tags=(),
+                 item_id=None):
+        self.desc = desc
+        self.target = target
+        self.percent = percent
+        self.subs = subs
+        self.tags = tags
+        self.id = item_id
 
-    elif command_main in ('ar', 'add-repeat'):
-        add_repeat(command_regex.group(2))
+    def __reduce__(self):
+        return (Goal, (self.desc, self.target, self.percent, self.subs,
+                       self.tags, self.id))
 
-    elif command_main in ('rr', 'remove-repeat'):
-        remove_value(task_data, int(command_extra) - 1, 3)
 
-    elif command_main in ('mv', 'm', 'move'):
-        move_item(command_extra, task_data)
-        update_order()
-        smart_display()
+class SubItem:
+    """A Subtask or Subgoal, whether it has been completed and its due date
+    if it has one."""
 
-    elif command_main in ('mvg', 'mg', 'move-goal'):
-        move_item(command_extra, goal_data)
-        update_order()
-        view_goals()
+    # The due date comes after the ID as Subitems were pickled without one
+    __slots__ = ('text', 'done', 'id', 'due')
 
-    elif command_main in ('ms', 'move-subtask'):
-        move_sub(command_extra, task_data)
-        smart_display()
+    def __init__(self, text, done=False, item_id=None, due=None):
+        self.text = text
+        self.done = done
+        self.id = item_id
+        self.due = due
 
-    elif command_main in ('msg', 'move-subgoal'):
-        move_sub(command_extra, goal_data)
-        view_goals(show_subs=True)
+    def __reduce__(self):
+        if self.due is None:
+            return (SubItem, (self.text, self.done, self.id))
+        return (SubItem, (self.text, self.done, self.id, self.due))
 
-    elif command_main in ('s', 'subtask'):
-        add_sub(command_regex.group(2), task_data)
-        smart_display()
 
-    elif command_main in ('sg', 'subgoal'):
-        add_sub(command_regex.group(2), goal_data)
-        view_goals(show_subs=True)
+def decide_action(command):
+    """Decide on the actions and function calls the command requires,
+    returning whether the command can have changed the data."""
+    started = time.perf_counter()
+    command_regex = COMMAND_REGEX.match(command)
+    command_main = command_regex.group(1).lower()
+    command_extra = command_regex.group(2)
+    action = COMMANDS.get(command_main)
+    command_stats.add('parse', time.perf_counter() - started)
 
-    elif command_main in ('cs', 'comp-subtask'):
-        complete_sub(command_extra, task_data)
+    if action is None:
+        print("  Command Not Recognised - Try Again or "
+              "Enter 'h' For Usage Instructions.")
+        return False
+
+    args = []
+    if action.arg == 'raw':
+        args.append(command_extra)
+    elif action.arg is not None:
+        args.append(command_extra.lower())
+    if action.target == 'task':
+        args.append(store.task_data)
+    elif action.target == 'goal':
+        args.append(store.goal_data)
+    action.handler(*args)
+    if action.refresh is None:
+        pass
+    elif deferred_refreshes is None:
+        action.refresh()
+    elif action.refresh not in deferred_refreshes:
+        deferred_refreshes.append(action.refresh)
+    return action.mutates
+
+
+# COMMANDS
+
+class Command:
+    """How decide_action runs a command.
+
+    The handler is passed the text after the command, lowercased unless arg
+    is 'raw' and left out if arg is None, followed by the task or goal list
+    when the command has that target. The data is only saved after
+    commands that mutate it, and refresh is the display shown afterwards.
+    """
+
+    __slots__ = ('handler', 'arg', 'target', 'mutates', 'refresh')
+
+    def __init__(self, handler, arg='lower', target=None, mutates=True, refresh=None):
+        self.handler = handler
+        self.arg = arg
+        self.target = target
+        self.mutates = mutates
+        self.refresh = refresh
+
+
+def register_command(aliases, handler, arg='lower', target=None, mutates=True,
+                     refresh=None):
+    """Make a command available under each of its aliases, replacing any
+    command already using them, and return it."""
+    action = Command(handler, arg, target, mutates, refresh)
+    for alias in aliases:
+        COMMANDS[alias] = action
+    return action
+
+
+def list_command(command_extra):
+    """Show the display asked for by a 'list' command."""
+    if command_extra in ('t', 'today'):
+        view_today()
+    elif command_extra in ('o', 'overdue'):
+        view_overdue()
+    elif command_extra in ('tm', 'tomorrow'):
+        view_tomorrow()
+    elif command_extra in ('f', 'future'):
+        view_tomorrow()
+        view_future()
+    elif command_extra in ('g', 'goals'):
+        view_goals()
+    elif command_extra in ('gs', 'goals-subs'):
+        view_goals(show_subs=True)
+    elif command_extra in ('a', 'all'):
+        view_goals()
         smart_display()
+    elif command_extra.startswith('tg') or command_extra.startswith('tag'):
+        view_specific_tag(command_extra)
+    elif command_extra.startswith('done'):
+        month = command_extra[4:].strip() or format_date(current_date)[:7]
+        if MONTH_REGEX.match(month):
+            view_archive(month)
+        else:
+            print("  Months Must Be Entered as YYYY-MM e.g. 2026-09.")
+    else:
+        smart_display(mini=True)
 
-    elif command_main in ('us', 'uncomp-subtask'):
-        uncomplete_sub(command_extra, task_data)
-        smart_display()
 
-    elif command_main in ('usg', 'uncomp-subgoal'):
-        uncomplete_sub(command_extra, goal_data)
-        view_goals(show_subs=True)
+def view_goal_command(command_extra):
+    """Show a single goal along with its subgoals."""
+    view_single_goal(int(command_extra) - 1)
 
-    elif command_main in ('ds', 'delete-subtask'):
-        delete_sub(command_extra, task_data)
-        smart_display()
 
-    elif command_main in ('es', 'edit-subtask'):
-        edit_sub(command_regex.group(2), task_data)
-        smart_display()
+def view_tags_command(command_extra, data_list):
+    """Show the tags of a Task or Goal, then wait for Enter at a terminal."""
+    view_items_tags(int(command_extra) - 1, data_list)
+    # Batches and the server have no one to press Enter, so end the line instead
+    if sys.stdin.isatty():
+        input()
+    else:
+        print()
 
-    elif command_main in ('csg', 'complete-subgoal'):
-        complete_sub(command_extra, goal_data)
-        view_goals(show_subs=True)
 
-    elif command_main in ('dsg', 'delete-subgoal'):
-        delete_sub(command_extra, goal_data)
-        view_goals(show_subs=True)
+def delete_command(command_extra, data_list):
+    """Delete a Task or Goal, or all of them after asking for confirmation."""
+    if command_extra not in ("all", 'a'):
+        delete_item(data_list[int(command_extra) - 1])
+        return
 
-    elif command_main in ('esg', 'edit-subgoal'):
-        edit_sub(command_regex.group(2), goal_data)
-        view_goals(show_subs=True)
+    if data_list is store.task_data:
+        kind, name = 'deleted-tasks', 'Task'
+    else:
+        kind, name = 'deleted-goals', 'Goal'
+    check = input("  This Will Delete All {} Data. Are You Sure "
+                  "You Want to Continue? (y/n): ".format(name))
+    if check.lower() in ('y', 'yes'):
+        store.history.record(kind, [('remove', item) for item in data_list])
+        store.clear_items(data_list)
+    else:
+        print("  Removal of All {}s Aborted.".format(name))
 
-    elif command_main in ('at', 'add-tag'):
-        add_tag(command_regex.group(2), task_data)
-        smart_display(mini=True)
 
-    elif command_main in ('agt', 'add-goal-tag'):
-        add_tag(command_regex.group(2), goal_data)
-        smart_display(mini=True)
+def complete_command(command_extra):
+    """Complete a task, or all of today's or overdue tasks."""
+    if command_extra in ('t', 'today'):
+        complete_today()
+    elif command_extra in ('o', 'overdue'):
+        complete_overdue()
+    else:
+        complete_task(store.task_data[int(command_extra) - 1])
 
-    elif command_main in ('vt', 'view-tags'):
-        view_items_tags(int(command_extra) - 1, task_data)
 
-    elif command_main in ('vgt', 'view-goal-tags'):
-        view_items_tags(int(command_extra) - 1, goal_data)
+def complete_goal_command(command_extra):
+    """Complete a goal."""
+    complete_goal(store.goal_data[int(command_extra) - 1])
 
-    elif command_main in ('rt', 'remove-tag'):
-        remove_tag(command_extra, task_data)
 
-    elif command_main in ('rgt', 'remove-goal-tag'):
-        remove_tag(command_extra, goal_data)
+def remove_repeat_command(command_extra):
+    """Stop a task from repeating."""
+    remove_value(store.task_data[int(command_extra) - 1], 'repeat')
 
-    elif command.lower() in ('u', 'undo'):
-        undo_action(deleted_tasks)
-        smart_display()
 
-    elif command.lower() in ('uc', 'uncheck'):
-        undo_action(completed_tasks)
-        smart_display()
+def begin_transaction():
+    """Start holding back saves until 'commit' or 'rollback'."""
+    global transaction_open
+    if transaction_open:
+        print("  A Transaction Is Already Open - Enter 'commit' or 'rollback' to End It.")
+        return
+    # Changes made before the transaction aren't rolled back with it
+    if not save_data():
+        return
+    transaction_open = True
+    print("  Transaction Started. Changes Won't Be Saved Until 'commit'.")
 
-    elif command.lower() in ('ug', 'undo-goal'):
-        undo_action(deleted_goals)
-        view_goals()
 
-    elif command.lower() in ('ucg', 'uncheck-goal'):
-        undo_action(completed_goals)
-        view_goals()
+def commit_transaction():
+    """Save the changes made since 'begin'."""
+    global transaction_open
+    if not transaction_open:
+        print("  No Transaction Is Open - Enter 'begin' to Start One.")
+        return
+    transaction_open = False
+    if save_data():
+        print("  Transaction Committed.")
 
-    elif command.lower() in ('h', 'help'):
-        show_help()
 
+def rollback_transaction():
+    """Undo the changes made since 'begin'."""
+    global transaction_open
+    if not transaction_open:
+        print("  No Transaction Is Open - Enter 'begin' to Start One.")
+        return
+    transaction_open = False
+    store.rollback()
+    print("  Transaction Rolled Back.")
+
+
+def stats_command(command_extra):
+    """Show the command stats, or write them to the file named."""
+    if command_extra:
+        try:
+            command_stats.dump(command_extra)
+        except OSError:
+            print("  Could Not Write to {}.".format(command_extra))
+            return
+        print("  Command Stats Written to {}".format(command_extra))
     else:
-        print("  Command Not Recognised - Try Again or "
-              "Enter 'h' For Usage Instructions.")
+        view_stats()
 
 
 # DISPLAY FUNCTIONS
 
+def rendered(view):
+    """Decorate a display function so its output is built up in a buffer
+    and written in one go, including that of any displays it calls."""
+    @functools.wraps(view)
+    def render(*args, **kwargs):
+        global render_buffer
+        if render_buffer is not None:
+            return view(*args, **kwargs)
+        started = time.perf_counter()
+        render_buffer = io.StringIO()
+        try:
+            with redirect_stdout(render_buffer):
+                return view(*args, **kwargs)
+        finally:
+            text = render_buffer.getvalue()
+            render_buffer = None
+            write_output(text)
+            command_stats.add('render', time.perf_counter() - started)
+    return render
+
+
+def write_output(text):
+    """Write rendered output to the terminal, through a pager if it won't fit."""
+    if (use_pager and sys.stdout.isatty()
+            and text.count('\n') >= get_terminal_size().lines):
+        try:
+            # -R lets less show the colours and underlining
+            pager = subprocess.Popen(os.environ.get('PAGER', 'less -R'), shell=True,
+                                     stdin=subprocess.PIPE, universal_newlines=True)
+            pager.communicate(text)
+            return
+        except OSError:
+            pass
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+@rendered
 def view_today():
     """Print all tasks due today."""
     print()
     print('  ' + FONT_DICT['green'] + "TODAY'S TASKS" + FONT_DICT['end'], end='\n\n')
-    empty = True
-    for task in task_data:
-        if task[2] == current_date:
-            print("   {}".format(task[0]).rjust(6) + "| {}".format(task[1]))
-            # Check for Subtasks
-            if task[4]:
-                print_sub(int(task[0] - 1), task_data)
-            empty = False
-    if empty:
+    task_num = None
+    for task_num, task in store.tasks_due(current_date, current_date + 1):
+        print("   {}".format(task_num + 1).rjust(6) + "| {}".format(task.desc))
+        # Check for Subtasks
+        if task.subs:
+            print_sub(task)
+    if task_num is None:
         print("    No Tasks Found")
     print()
 
 
+@rendered
 def view_tomorrow():
     """Print all tasks that are due tomorrow."""
     print()
     print('  ' + FONT_DICT['orange'] + "TOMORROW'S TASKS" + FONT_DICT['end'], end='\n\n')
-    empty = True
-    for task in task_data:
-        if ((dt.strptime(task[2], '%Y-%m-%d')
-             - current_datetime).days) == 1:
-            print("    {}".format(task[0]).rjust(6) + "| {}".format(task[1]))
-            # Check for Subtasks
-            if task[4]:
-                print_sub(int(task[0] - 1), task_data)
-            empty = False
-    if empty:
+    task_num = None
+    for task_num, task in store.tasks_due(current_date + 1, current_date + 2):
+        print("    {}".format(task_num + 1).rjust(6) + "| {}".format(task.desc))
+        # Check for Subtasks
+        if task.subs:
+            print_sub(task)
+    if task_num is None:
         print("    No Tasks Found")
     print()
 
 
+@rendered
 def view_overdue():
     """Print all tasks that are overdue."""
     print()
     print('  ' + FONT_DICT['red'] + "OVERDUE TASKS" + FONT_DICT['end'], end='\n\n')
-    empty = True
-    for task in task_data:
-        if task[2] < current_date:
-            over = ((current_datetime
-                     - dt.strptime(task[2], '%Y-%m-%d')).days)
-            if over == 1:
-                print("    {}".format(task[0]).rjust(6)
-                      + "| {} [Due Yesterday]".format(task[1]))
-            else:
-                print("    {}".format(task[0]).rjust(6)
-                      + "| {} [Due {} Days Ago]".format(task[1], over))
-            # Check for Subtasks
-            if task[4]:
-                print_sub(int(task[0] - 1), task_data)
-            empty = False
-    if empty:
+    task_num = None
+    for task_num, task in store.tasks_due(end=current_date):
+        over = current_date - task.due
+        if over == 1:
+            print("    {}".format(task_num + 1).rjust(6)
+                  + "| {} [Due Yesterday]".format(task.desc))
+        else:
+            print("    {}".format(task_num + 1).rjust(6)
+                  + "| {} [Due {} Days Ago]".format(task.desc, over))
+        # Check for Subtasks
+        if task.subs:
+            print_sub(task)
+    if task_num is None:
         print("    No Tasks Found")
     print()
 
 
+@rendered
 def view_future():
     """Print all tasks with due dates beyond tomorrow"""
     print()
     print('  ' + FONT_DICT['blue'] + "FUTURE TASKS" + FONT_DICT['end'], end='\n\n')
-    empty = True
-    for task in task_data:
-        if task[2] > current_date:
-            until = ((dt.strptime(task[2], '%Y-%m-%d')
-                          - current_datetime).days)
-            if until > 1:
-                print("    {}".format(task[0]).rjust(6)
-                      + "| {} [Due in {} Days]".format(task[1], until))
-            # Check for Subtasks
-                if task[4]:
-                    print_sub(int(task[0] - 1), task_data)
-                empty = False
-    if empty:
+    task_num = None
+    for task_num, task in store.tasks_due(current_date + 2):
+        until = task.due - current_date
+        print("    {}".format(task_num + 1).rjust(6)
+              + "| {} [Due in {} Days]".format(task.desc, until))
+        # Check for Subtasks
+        if task.subs:
+            print_sub(task)
+    if task_num is None:
         print("    No Tasks Found")
     print()
 
 
+def date_range(start=None, end=None):
+    """Return the positions of the first and last-plus-one Tasks due from
+    the start date up to, but not including, the end date.
+
+    Relies upon insert_task() and set_due() keeping task_data sorted by due
+    date so the bounds can be found by bisection rather than scanning every
+    Task.
+    """
+    if start is None:
+        first = 0
+    else:
+        first = bisect_left(store.task_data, start, key=attrgetter('due'))
+    if end is None:
+        last = len(store.task_data)
+    else:
+        last = bisect_left(store.task_data, end, lo=first, key=attrgetter('due'))
+    return first, last
+
+
 def view_goal(goal_num, subs=False):
     """Display an individual goal with optional subtask display."""
-    goal = goal_data[goal_num]
-    progress = goal[3]
+    goal = store.goal_data[goal_num]
+    progress = goal.percent
     if progress == 'auto':
-        percent_done = auto_percentage(goal[0] - 1) // 5
+        percent_done = auto_percentage(goal) // 5
     else:
         percent_done = int(progress) // 5
 
-    print("    {}".format(goal[0]).rjust(6), end='')
-    if goal[2] and goal[4] and not subs:
-        print("| {} [Target: {}]   ...".format(goal[1].upper(), goal[2]))
-    elif goal[2] and not goal[4]:
-        print("| {} [Target: {}]".format(goal[1].upper(), goal[2]))
-    elif goal[4] and not goal[2] and not subs:
-        print("| {}   ...".format(goal[1].upper()))
+    print("    {}".format(goal_num + 1).rjust(6), end='')
+    if goal.target and goal.subs and not subs:
+        print("| {} [Target: {}]   ...".format(goal.desc.upper(), goal.target))
+    elif goal.target and not goal.subs:
+        print("| {} [Target: {}]".format(goal.desc.upper(), goal.target))
+    elif goal.subs and not goal.target and not subs:
+        print("| {}   ...".format(goal.desc.upper()))
     else:
-        print("| {}".format(goal[1].upper()))
+        print("| {}".format(goal.desc.upper()))
 
     print("        {}{}{}{}{}".format(FONT_DICT['green no u'], '+' * percent_done,
             FONT_DICT['red no u'], '-' * (20 - percent_done), FONT_DICT['end']))
     # Check for Subtasks
-    if goal[4] and subs:
-        print_sub(int(goal[0] - 1), goal_data)
+    if goal.subs and subs:
+        print_sub(goal)
 
 
+@rendered
+def view_single_goal(goal_num):
+    """Display a goal on its own, along with its subgoals."""
+    print()
+    view_goal(goal_num, subs=True)
+
+
+@rendered
 def view_goals(show_subs=False):
     """Display all goals either with or without subgoals."""
+    if not show_displays:
+        return
     print()
     print('  ' + FONT_DICT['magenta'] + "GOALS" + FONT_DICT['end'], end='\n\n')
-    if not goal_data:
+    if not store.goal_data:
         print("    No Goals Found")
         return
-    for goal in goal_data:
-        view_goal(int(goal[0]) - 1, show_subs)
+    for goal_num in range(len(store.goal_data)):
+        view_goal(goal_num, show_subs)
 
     if show_subs:
         print(end='\n')
@@ -345,21 +482,23 @@ def view_goals(show_subs=False):
         print("        Subgoals Are Hidden. Use 'ls gs' To View Them", end='\n\n')
 
 
+@rendered
 def smart_display(mini=False):
     """Check if a list has Tasks in it before displaying it."""
-    if not task_data:
+    if not show_displays:
+        return
+    if not store.task_data:
         print()
         print(FONT_DICT['red no u'] + "    NO TASKS TO DISPLAY" + FONT_DICT['end'])
         return
     empty = True
-    if task_data[0][2] < current_date:
+    if date_range(end=current_date)[1]:
         view_overdue()
         empty = False
-    for task in task_data:
-        if task[2] == current_date:
-            view_today()
-            empty = False
-            break
+    first, last = date_range(current_date, current_date + 1)
+    if first != last:
+        view_today()
+        empty = False
     if mini:
         if empty:
             print()
@@ -367,61 +506,139 @@ def smart_display(mini=False):
                   + FONT_DICT['end'], end='\n\n')
         return
 
-    for task in task_data:
-        if ((dt.strptime(task[2], '%Y-%m-%d')
-            - current_datetime).days) == 1:
-            view_tomorrow()
-            break
-    if ((dt.strptime(task_data[-1][2], '%Y-%m-%d')
-        - current_datetime).days) > 1:
+    first, last = date_range(current_date + 1, current_date + 2)
+    if first != last:
+        view_tomorrow()
+    if store.task_data[-1].due >= current_date + 2:
         view_future()
 
 
-def print_sub(item_num, data_list):
+@rendered
+def view_archive(month):
+    """Print the Tasks and Goals completed in a month, numbered for 'restore'."""
+    print()
+    print('  ' + FONT_DICT['green'] + "COMPLETED IN " + month + FONT_DICT['end'], end='\n\n')
+    archived = store.archive.month_items(month)
+    for num, (completed, item) in enumerate(archived, 1):
+        kind = 'Task' if type(item) is Task else 'Goal'
+        print("    {}".format(num).rjust(6) + "| {} [{} Completed {}]".format(
+            item.desc, kind, format_date(completed)))
+        if item.subs:
+            print_sub(item)
+    if not archived:
+        print("    Nothing Found")
+    print()
+
+
+def print_sub(item):
     """Print a Task's Subtasks."""
-    for num, subtask in enumerate(data_list[item_num][4], 1):
-        if subtask.endswith('^'):
-            undone = subtask.rstrip('^')
-            subtask = strike_text(undone)
-        print("        {}".format(num).rjust(8) + ") {}".format(subtask))
+    for num, subitem in enumerate(item.subs, 1):
+        if subitem.done:
+            subtask = strike_text(subitem.text)
+        else:
+            subtask = subitem.text
+        if subitem.due is None:
+            print("        {}) {}".format(num, subtask))
+        else:
+            print("        {}) {} [Due: {}]".format(num, subtask, format_date(subitem.due)))
     print()
 
 
 def view_specific_tag(command_extra):
-    """Display all Goals and Tasks with a specified tag."""
-    tag_regex = re.search(r'^(\w*)\s?(\w*)?', command_extra)
-    tag = tag_regex.group(2).lower()
-    if not tag:
-        tag = input("  Enter the Tag You Wish to View: ").lower()
+    """Display all Goals and Tasks matching a tag query."""
+    tag_regex = ITEM_REGEX.match(command_extra)
+    query = tag_regex.group(2).lower()
+    if not query:
+        query = input("  Enter the Tag You Wish to View: ").lower()
+    goals, tasks = [], []
+    for item in (store.item_index[item_id] for item_id in tag_query(query)):
+        if type(item) is Task:
+            tasks.append((store.item_position(item), item))
+        else:
+            goals.append((store.item_position(item), item))
+    print_matches("TAGGED WITH " + query.upper(), sorted(goals, key=itemgetter(0)),
+                  sorted(tasks, key=itemgetter(0)))
+
+
+def tag_query(query):
+    """Return the IDs of the items matching a tag query.
+
+    Tags joined with '+' must all be present and comma separated
+    alternatives need only one to match, so 'work+urgent,home' finds
+    items tagged with both work and urgent along with any tagged home.
+    """
+    matches = set()
+    for alternative in query.split(','):
+        tags = alternative.strip().split('+')
+        # Intersect starting from the rarest tag to keep the sets small
+        tagged = sorted((store.tagged_ids(tag.strip()) for tag in tags), key=len)
+        matches |= tagged[0].intersection(*tagged[1:])
+    return matches
+
+
+def view_search(query):
+    """Display the Goals and Tasks matching a search, best matches first."""
+    if not query:
+        query = input("  Enter the Words to Search For: ").lower()
+    goals, tasks = [], []
+    for item in (store.item_index[item_id] for item_id in store.word_search(query)):
+        if type(item) is Task:
+            tasks.append((store.item_position(item), item))
+        else:
+            goals.append((store.item_position(item), item))
+    print_matches("MATCHING " + query.upper(), goals, tasks)
+
+
+@rendered
+def print_matches(heading, goals, tasks):
+    """Print the positions and details of the Goals and Tasks found by a
+    tag query or search."""
     print()
-    print('  ' + FONT_DICT['magenta'] + "GOALS TAGGED WITH "
-          + tag.upper() + FONT_DICT['end'])
-    for goal in goal_data:
-        if tag in goal[5]:
-            print("    {}| {} ({})".format(goal[0], goal[1], goal[2]))
+    print('  ' + FONT_DICT['magenta'] + "GOALS " + heading + FONT_DICT['end'])
+    for goal_num, goal in goals:
+        print("    {}| {} ({})".format(goal_num + 1, goal.desc, goal.target))
     print()
 
-    print('  ' + FONT_DICT['green'] + "TASKS TAGGED WITH "
-          + tag.upper() + FONT_DICT['end'])
-    for task in task_data:
-        if tag in task[5]:
-            print("    {}| {} ({})".format(task[0], task[1], task[2]))
+    print('  ' + FONT_DICT['green'] + "TASKS " + heading + FONT_DICT['end'])
+    for task_num, task in tasks:
+        print("    {}| {} ({})".format(task_num + 1, task.desc, format_date(task.due)))
     print()
 
 
+@rendered
 def view_items_tags(item_num, data_list):
     """Print the tags associated with the chosen item."""
-    print("  Item '{}' is tagged with: ".format(data_list[item_num][1]), end='')
-    for tag in data_list[item_num][5]:
+    print("  Item '{}' is tagged with: ".format(data_list[item_num].desc), end='')
+    for tag in data_list[item_num].tags:
         print("" + tag, end=', ')
-    input()
+
+
+@rendered
+def view_stats():
+    """Print the average time each kind of command has taken this session."""
+    print()
+    print('  ' + FONT_DICT['magenta'] + "COMMAND STATS" + FONT_DICT['end'], end='\n\n')
+    if not command_stats.records:
+        print("    No Commands Run Yet")
+        print()
+        return
+    print("    {:<10}{:>6}{:>10}{:>9}{:>9}{:>9}{:>9}{:>10}{:>11}".format(
+        'COMMAND', 'RUNS', 'TOTAL MS', 'PARSE', 'MUTATE', 'RENDER', 'SAVE', 'BYTES',
+        'PEAK KIB'))
+    for name, runs in command_stats.summary():
+        print("    {:<10}{:>6}{:>10.2f}{:>9.2f}{:>9.2f}{:>9.2f}{:>9.2f}{:>10}{:>11}".format(
+            name, runs['runs'], *(runs[phase] * 1000 for phase in CommandStats.TIMES),
+            runs['bytes'], '-' if runs['peak_memory'] is None else runs['peak_memory'] // 1024))
+    print()
+    print("    Times are averages in milliseconds, bytes are totals written when saving")
+    print()
 
 
 # TASK FUNCTIONS
 
 def add_task(command_extra):
     """Add a new task to the task list."""
-    add_regex = re.search(r'^"(.*)"\s?(\S*)?\s?(.*)?', command_extra)
+    add_regex = TASK_ADD_REGEX.match(command_extra)
     task = add_regex.group(1)
     opt_date = add_regex.group(2)
     opt_repeat = add_regex.group(3)
@@ -429,70 +646,48 @@ def add_task(command_extra):
     if opt_date in ('t', ''):
         date = current_date
     elif opt_date == 'tm':
-        date_tomorrow = current_datetime + timedelta(1)
-        date = dt.strftime(date_tomorrow, '%Y-%m-%d')
+        date = current_date + 1
     elif opt_date in DAY_NAMES:
         date = named_day_date(opt_date)
     elif verify_date(opt_date):
-        date = opt_date
+        date = parse_date(opt_date)
     else:
         return
 
     if opt_repeat:
         parsed_repeat = parse_repeat(opt_repeat)
-        if verify_repeats(parsed_repeat, date):
-            repeat = parsed_repeat
+        if verify_repeats(parsed_repeat):
+            repeat = pin_repeat(parsed_repeat, date)
         else:
             return
     else:
         repeat = ''
-    task_data.append([len(task_data) + 1, task, date, repeat, [], []])
+    store.insert_task(Task(task, date, repeat, item_id=store.new_id()))
 
 
 def named_day_date(day_name):
     """Returns the date of the next occurence of a named day."""
-    test_date = dt.now()
-
-    while True:
-        next_day = test_date + timedelta(1)
-        name_test = dt.strftime(next_day, '%a').lower()
-        if name_test == day_name:
-            return dt.strftime(next_day, '%Y-%m-%d')
-        else:
-            test_date = next_day
-
-
-def complete_task(task_num, print_msg=True):
-    """Mark a task as complete."""
-    repeat = task_data[task_num][3]
-    if repeat != '':
-        # Append copy of data so non-repeat date can be restored using 'Uncheck'
-        data_copy = task_data[task_num][:]
-        completed_tasks.append(data_copy)
-
-        if type(repeat) is int:
-            old_date = dt.strptime(task_data[task_num][2], '%Y-%m-%d')
-            new_date = old_date + timedelta(int(task_data[task_num][3]))
-            task_data[task_num][2] = dt.strftime(new_date, '%Y-%m-%d')
-
-            # Check for Subtasks and reset them if found
-            if task_data[task_num][4] != '':
-                reset_subs(task_num)
-
-        elif type(repeat) is list:
-            if '-' in repeat[0]:
-                date_list_comp(task_num, repeat, print_msg)
-            else:
-                name_list_comp(task_num, repeat, print_msg)
-            return
-
-        elif repeat.endswith('m'):
-            complete_monthly(task_num, repeat, print_msg)
-            return
-
-
+    return next(occurrences(current_date, day_name))
+
+
+def complete_task(task, print_msg=True):
+    """Mark a task as complete, moving it on to its next due date if it repeats."""
+    new_date = None
+    if task.repeat != '':
+        pin_repeat_day(task)
+        new_date = next(occurrences(task.due, task.repeat), None)
+        if new_date is None:
+            print("  Reached The End of This Task's Repeat Dates So Marking as Complete.")
+
+    store.history.record('completed-tasks', [completion_change(task, new_date)])
+    if new_date is None:
+        store.remove_item(task)
+        store.archive.add(task)
     else:
-        completed_tasks.append(task_data.pop(task_num))
+        # Check for Subtasks and reset them if found
+        if task.subs:
+            reset_subs(task)
+        store.set_due(task, new_date)
 
     if print_msg:
         print("  Task marked as complete. Enter 'uncheck' or 'uc' to restore.")
@@ -500,146 +695,89 @@ def complete_task(task_num, print_msg=True):
 
 def complete_today():
     """Mark all of today's tasks as complete."""
-    to_complete = []
-    for task in task_data:
-        if task[2] == current_date:
-            to_complete.append(task[0] - 1)
-    # Process tasks to be deleted in reverse to keep the task numbers the same
-    for task_num in to_complete[::-1]:
-        complete_task(task_num, print_msg=False)
+    first, last = date_range(current_date, current_date + 1)
+    complete_range(first, last, current_date + 1)
     print("  Today's Tasks marked as complete.")
 
 
 def complete_overdue():
     """Mark all overdue tasks as complete."""
-    while True:
-        to_complete = []
-        for task in task_data:
-            if dt.strptime(task[2], '%Y-%m-%d') < current_datetime:
-                to_complete.append(task[0] - 1)
-            else:
-                break
-
-        for task_num in to_complete[::-1]:
-            complete_task(task_num, print_msg=False)
-        update_order()
-
-        if dt.strptime(task_data[0][2], '%Y-%m-%d') > current_datetime - timedelta(1):
-            print("  Overdue Tasks marked as complete.")
-            return
-
+    first, last = date_range(end=current_date)
+    complete_range(first, last, current_date)
+    print("  Overdue Tasks marked as complete.")
 
-def complete_monthly(task_num, repeat, print_msg=True):
-    """Change a task's due date by a specified amount of months."""
-    num_months = int(repeat.rstrip('m'))
-    current_due_list = task_data[task_num][2].split('-')
-    current_month = int(current_due_list[1])
-    new_month = str(current_month + num_months % 12).zfill(2)
-    current_due_list[1] = new_month
-    task_data[task_num][2] = '-'.join(current_due_list)
 
-    if task_data[task_num][4] != '':
-        reset_subs(task_num)
+def complete_range(first, last, start_date):
+    """Mark the tasks between two positions in the task list as complete in one
+    go, moving each repeating one straight to its first due date from start_date.
 
-    if print_msg:
-        print("  Task Marked as Complete. Enter 'uncheck' or 'uc' to Restore.")
-
-
-def date_list_comp(task_num, repeat, print_msg=True):
-    """Change a task's due date to the next date in the repeat list."""
-    try:
-        date_position = repeat.index(task_data[task_num][2])
-
-    except ValueError:
-        print("  Is The Due Date One of the Listed Repeat Dates? If Not, "
-            "Change It To One.")
+    The completions share one history entry so one 'uncheck' undoes them all.
+    """
+    tasks = store.task_data[first:last]
+    if not tasks:
         return
 
-    if date_position == len(repeat) - 1:
-        print("  Reached The End of This Task's Repeat Dates So Marking as Complete.")
-        completed_tasks.append(task_data.pop(task_num))
-        print("  Task Marked as Complete. Enter 'uncheck' or 'uc' to Restore.")
-
-    else:
-        task_data[task_num][2] = repeat[date_position + 1]
-
-        if task_data[task_num][4] != '':
-            reset_subs(task_num)
-
-        if print_msg:
-            print("  Task Marked as Complete. Enter 'uncheck' or 'uc' to Restore.")
-
-
-def name_list_comp(task_num, repeat, print_msg=True):
-    """Change a task's due date to the next day named in the repeat list."""
-    # Find the name of current due day for processing day name list
-    current_due = dt.strptime(task_data[task_num][2], '%Y-%m-%d')
-    current_day = dt.strftime(current_due, '%a').lower()
-    # Find the next day listed
-    try:
-        day_position = repeat.index(current_day)
-    except ValueError:
-        print("  Is The Due Date One of the Listed Repeat Days? If Not, "
-              "Change It To One.")
-        return
-
-    if day_position == len(repeat) - 1:
-        target_day = repeat[0]
-    else:
-        target_day = repeat[day_position + 1]
-    # Cycle through days until the day matches
-    checked_day = current_due
-    while True:
-        day_test = checked_day + timedelta(1)
-        day_name = dt.strftime(day_test, '%a').lower()
-        if day_name == target_day:
-            new_date = day_test
-            break
-        else:
-            checked_day = day_test
-
-    task_data[task_num][2] = dt.strftime(new_date, '%Y-%m-%d')
-
-    if task_data[task_num][4] != '':
-        reset_subs(task_num)
-
-    if print_msg:
-        print("  Task Marked as Complete. Enter 'uncheck' or 'uc' to Restore.")
+    new_dates = []
+    changes = []
+    for task in tasks:
+        new_date = None
+        if task.repeat != '':
+            pin_repeat_day(task)
+            new_date = next(occurrences(task.due, task.repeat, start=start_date), None)
+        new_dates.append(new_date)
+        changes.append(completion_change(task, new_date))
+        if new_date is not None and task.subs:
+            reset_subs(task)
+
+    store.history.record('completed-tasks', changes)
+    store.reschedule(first, last, new_dates)
+    for change in changes:
+        if change[0] == 'remove':
+            store.archive.add(change[1])
+
+
+def completion_change(task, new_date):
+    """Return the history change for completing a task, which is removed when
+    it has no new due date to move on to and archived under today's date."""
+    if new_date is None:
+        return ('remove', task, current_date)
+    return ('due', task.id, task.due, new_date, [sub.id for sub in task.subs if sub.done])
 
 
 def change_date(command_extra):
     """Change the due date of a task."""
-    date_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    task_num = int(date_regex.group(1)) - 1
+    date_regex = ITEM_REGEX.match(command_extra)
+    task = store.task_data[int(date_regex.group(1)) - 1]
     command_date = date_regex.group(2)
     if command_date:
         if command_date == 't':
-            task_data[task_num][2] = current_date
+            store.set_due(task, current_date)
         elif command_date == 'tm':
-            new_date = current_datetime + timedelta(1)
-            task_data[task_num][2] = dt.strftime(new_date, '%Y-%m-%d')
+            store.set_due(task, current_date + 1)
         elif command_date in DAY_NAMES:
-            task_data[task_num][2] = named_day_date(command_date.lower())
+            store.set_due(task, named_day_date(command_date.lower()))
         else:
             if verify_date(date_regex.group(2)):
-                task_data[task_num][2] = date_regex.group(2)
+                store.set_due(task, parse_date(date_regex.group(2)))
     else:
-        print("  Enter New Due Date For {}: (YYYY-MM-DD)".format(task_data[task_num][1]))
+        print("  Enter New Due Date For {}: (YYYY-MM-DD)".format(task.desc))
         new_date = input("  ")
         if verify_date(new_date):
-            task_data[task_num][2] = new_date
+            store.set_due(task, parse_date(new_date))
+    # A monthly repeat follows the day of the month the task is now due on
+    if pin_repeat(task.repeat, task.due) != task.repeat:
+        store.set_value(task, 'repeat', pin_repeat(task.repeat, task.due))
 
 
 def add_repeat(command_extra):
     """Add a repeat to a task."""
-    repeat_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    task_num = int(repeat_regex.group(1)) - 1
+    repeat_regex = ITEM_REGEX.match(command_extra)
+    task = store.task_data[int(repeat_regex.group(1)) - 1]
     command_rep = repeat_regex.group(2)
-    due_date = task_data[task_num][2]
 
     if command_rep:
         parsed_repeat = parse_repeat(command_rep)
-        if not verify_repeats(parsed_repeat, due_date):
+        if not verify_repeats(parsed_repeat):
             return
 
     else:
@@ -647,13 +785,110 @@ def add_repeat(command_extra):
               "mon,wed,sat' or '2018-01-01,2018-02-01': ")
         inputted_repeat = input("  ").lower()
         parsed_repeat = parse_repeat(inputted_repeat)
-        if not verify_repeats(parsed_repeat, due_date):
+        if not verify_repeats(parsed_repeat):
             return
 
-    task_data[task_num][3] = parsed_repeat
+    store.set_value(task, 'repeat', pin_repeat(parsed_repeat, task.due))
     print("  Repeat Sucessfully Added to Task.")
 
 
+def occurrences(due_date, repeat, limit=None, start=None):
+    """Yield the dates a Task repeating from a due date falls due next, in
+    order, stopping after limit dates or when a list of dates runs out.
+
+    Every form of repeat returned by parse_repeat() is covered, with each
+    date worked out directly from the due date rather than by stepping
+    through the days in between. Dates before start are skipped the same way.
+    """
+    if limit is not None:
+        yield from islice(occurrences(due_date, repeat, start=start), limit)
+        return
+
+    if start is None or start <= due_date:
+        start = due_date + 1
+    if type(repeat) is int:
+        steps = -(-(start - due_date) // repeat) if repeat else 1
+        yield from count(due_date + repeat * steps, repeat)
+        return
+    monthly = MONTHLY_REGEX.match(repeat) if type(repeat) is str else None
+    if monthly:
+        num_months = int(monthly.group(1))
+        day = int(monthly.group(2) or dt.fromordinal(due_date).day)
+        # Start from the repeat in or before start's month and catch up
+        start_date, date = dt.fromordinal(start), dt.fromordinal(due_date)
+        months = (start_date.year - date.year) * 12 + start_date.month - date.month
+        steps = max(1, months // num_months) if num_months else 1
+        while num_months and add_months(due_date, num_months * steps, day) < start:
+            steps += 1
+        for step in count(steps):
+            yield add_months(due_date, num_months * step, day)
+
+    repeats = repeat if type(repeat) is list else [repeat]
+    if '-' in repeats[0]:
+        # Dates at or before the due date have already been and gone
+        for date in sorted(parse_date(date) for date in repeats):
+            if date >= start:
+                yield date
+        return
+
+    # Days from the due date to each named day in the week following it
+    due_day = (due_date - 1) % 7
+    offsets = sorted({(DAY_NAMES.index(day_name) - due_day - 1) % 7 + 1
+                      for day_name in repeats})
+    for week_start in count(due_date + (start - due_date - 1) // 7 * 7, 7):
+        for offset in offsets:
+            if week_start + offset >= start:
+                yield week_start + offset
+
+
+def add_months(date_ordinal, num_months, day=None):
+    """Return the date a number of months after another, on the given day of
+    the month or else the same day as the other.
+
+    Days past the end of a shorter month fall on its last day.
+    """
+    date = dt.fromordinal(date_ordinal)
+    year, month = divmod(date.year * 12 + date.month - 1 + num_months, 12)
+    month += 1
+    day = min(day or date.day, monthrange(year, month)[1])
+    return date.replace(year=year, month=month, day=day).toordinal()
+
+
+def month_day(date_ordinal):
+    """Return the day of the month a monthly repeat from a date falls on,
+    which is 31 for a date on the last day of its month."""
+    date = dt.fromordinal(date_ordinal)
+    if date.day == monthrange(date.year, date.month)[1]:
+        return 31
+    return date.day
+
+
+def pin_repeat(repeat, due_date):
+    """Return a repeat with a monthly repeat pinned to the day of the month
+    of a due date, as [num]m:[day], leaving any other repeat as it is.
+
+    Without the day a date clamped to the end of a shorter month couldn't be
+    told apart from one that was meant to be there, and would drift.
+    """
+    monthly = MONTHLY_REGEX.match(repeat) if type(repeat) is str else None
+    if monthly is None:
+        return repeat
+    return '{}m:{}'.format(monthly.group(1), month_day(due_date))
+
+
+def pin_repeat_day(task):
+    """Pin a monthly repeat set before repeats kept their day of the month to
+    the day of the month the task is due on.
+
+    Such repeats always stayed on that day, so one due on the 28th of February
+    stays on the 28th rather than moving to the end of each month.
+    """
+    monthly = MONTHLY_REGEX.match(task.repeat) if type(task.repeat) is str else None
+    if monthly and monthly.group(2) is None:
+        store.set_value(task, 'repeat', '{}m:{}'.format(monthly.group(1),
+                                                        dt.fromordinal(task.due).day))
+
+
 def parse_repeat(unparsed_rep):
     """Parse a repeat returning it as a single item or a list as appropriate."""
     if ',' in unparsed_rep:
@@ -667,9 +902,7 @@ def parse_repeat(unparsed_rep):
 
 def verify_date(potential_date):
     """Check that a date is able to be parsed correctly."""
-    try:
-        dt.strptime(potential_date, '%Y-%m-%d')
-    except ValueError:
+    if not date_is_valid(potential_date):
         input("  Date Entered Doesn't Match the Required "
                    "(YYYY-MM-DD) Format.".upper())
         print()
@@ -678,58 +911,66 @@ def verify_date(potential_date):
     return True
 
 
-def verify_day_name(potential_day):
-    """Check that a day name is formatted correctly."""
-    if potential_day not in DAY_NAMES:
-        input("  Not All Day Names Were In the Correct Format.".upper())
-        print()
-    else:
-        return True
+def date_is_valid(date_text):
+    """Check that a date is able to be parsed correctly, without prompting."""
+    try:
+        dt.strptime(date_text, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def parse_date(date_text):
+    """Convert a YYYY-MM-DD date into the ordinal used to store due dates."""
+    return dt.strptime(date_text, '%Y-%m-%d').toordinal()
+
 
+def format_date(date_ordinal):
+    """Convert a stored due date ordinal into a YYYY-MM-DD date."""
+    return dt.fromordinal(date_ordinal).strftime('%Y-%m-%d')
 
-def verify_repeats(parsed_repeat, due_date=False):
+
+def verify_repeats(parsed_repeat):
     """Check that a repeat is in the required format."""
+    problem = repeat_problem(parsed_repeat)
+    if problem:
+        input(("  " + problem).upper())
+        print()
+        return
+    return True
 
+
+def repeat_problem(parsed_repeat):
+    """Return why a repeat isn't in the required format, or None if it is,
+    without prompting."""
     if type(parsed_repeat) is list:
         if '-' in parsed_repeat[0]:
-            for date in parsed_repeat:
-                if not verify_date(date):
-                    return
-        else:
-            for day_name in parsed_repeat:
-                if not verify_day_name(day_name):
-                    return
+            if not all(date_is_valid(date) for date in parsed_repeat):
+                return "Date Entered Doesn't Match the Required (YYYY-MM-DD) Format."
+        elif not all(day_name in DAY_NAMES for day_name in parsed_repeat):
+            return "Not All Day Names Were In the Correct Format."
 
     elif type(parsed_repeat) is int:
-        return True
+        return None
 
-    elif parsed_repeat.endswith('m'):
-        num_months = parsed_repeat.strip('m')
-        if not num_months.isnumeric():
-            input("  Monthly Repeat Entered Does Not Match "
-                    "the Required [num]m Format.".upper())
-            return
-
-        if int(due_date[-2:]) > 28:
-            input("  Monthly Repeats With Dates Above 27 "
-                    "Need To be Done Manually.".upper())
-            return
+    elif '-' in parsed_repeat:
+        if not date_is_valid(parsed_repeat):
+            return "Date Entered Doesn't Match the Required (YYYY-MM-DD) Format."
 
-    else:
-        if '-' in parsed_repeat:
-            if not verify_date(parsed_repeat):
-                return
-        elif parsed_repeat.isalpha():
-            if not verify_day_name(parsed_repeat):
-                return
-    return True
+    elif parsed_repeat.endswith('m') or ':' in parsed_repeat:
+        monthly = MONTHLY_REGEX.match(parsed_repeat)
+        if not monthly or not 1 <= int(monthly.group(2) or 1) <= 31:
+            return "Monthly Repeat Entered Does Not Match the Required [num]m Format."
+    elif parsed_repeat.isalpha() and parsed_repeat not in DAY_NAMES:
+        return "Not All Day Names Were In the Correct Format."
+    return None
 
 
 # GOAL FUNCTIONS
 
 def add_goal(command_extra):
     """Add a new goal to the goal list."""
-    gadd_regex = re.search(r'^"(.*)"\s?"?([^"]*)?"?\s?(.*)?', command_extra)
+    gadd_regex = GOAL_ADD_REGEX.match(command_extra)
     goal = gadd_regex.group(1)
     opt_target = gadd_regex.group(2)
     opt_percent = gadd_regex.group(3)
@@ -744,206 +985,298 @@ def add_goal(command_extra):
     else:
         percent = 'auto'
 
-    goal_data.append([len(goal_data) + 1, goal, target, percent, [], []])
+    store.insert_item(store.goal_data, len(store.goal_data), Goal(goal, target, percent, item_id=store.new_id()))
 
 
-def complete_goal(task_num):
+def complete_goal(goal):
     """Move a goal to the completed cache."""
-    completed_goals.append(goal_data.pop(task_num))
+    store.history.record('completed-goals', [('remove', goal, current_date)])
+    store.remove_item(goal)
+    store.archive.add(goal)
     print("  Goal marked as complete. Enter 'uncheck-goal' or 'ucg' to restore.")
 
 
 def change_target(command_extra):
     """Change the target date of a goal."""
-    target_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    goal_num = int(target_regex.group(1)) - 1
+    target_regex = ITEM_REGEX.match(command_extra)
+    goal = store.goal_data[int(target_regex.group(1)) - 1]
     if target_regex.group(2):
         new_target = target_regex.group(2)
     else:
-        new_target = input("  Enter New Target For {}:".format(goal_data[goal_num][1]))
-    goal_data[goal_num][2] = new_target
+        new_target = input("  Enter New Target For {}:".format(goal.desc))
+    store.set_value(goal, 'target', new_target)
 
 
-def auto_percentage(goal_num):
-    """Calculate percentage completion from percentage of subgoals completed."""
-    num_subs = len(goal_data[goal_num][4])
-    if num_subs == 0:
+def auto_percentage(goal):
+    """Calculate percentage completion from the count of subgoals completed."""
+    if not goal.subs:
         return 0
-
-    done_subs = 0
-    for sub in goal_data[goal_num][4]:
-        if sub.endswith('^'):
-            done_subs += 1
-    return int((done_subs / num_subs) * 100)
+    return store.done_counts[goal.id] * 100 // len(goal.subs)
 
 
 def change_percentage(command_extra):
     """Change the completion percentage of a goal."""
-    percentage_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    goal_num = int(percentage_regex.group(1)) - 1
+    percentage_regex = ITEM_REGEX.match(command_extra)
+    goal = store.goal_data[int(percentage_regex.group(1)) - 1]
     if percentage_regex.group(2):
         new_percentage = percentage_regex.group(2)
     else:
         new_percentage = input("  Enter New Completion Percentage {}: "
-                               .format(goal_data[goal_num][1]))
-    goal_data[goal_num][3] = new_percentage
+                               .format(goal.desc))
+    store.set_value(goal, 'percent', new_percentage)
 
 
 # SUBITEM FUNCTIONS
 
 def add_sub(command_extra, data_list):
     """Add a Subtask to a Task or Goal."""
-    sub_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    item_num = int(sub_regex.group(1)) - 1
+    sub_regex = ITEM_REGEX.match(command_extra)
+    item = data_list[int(sub_regex.group(1)) - 1]
     subtask = sub_regex.group(2)
     if not subtask:
         subtask = input("  Enter Subitem: ")
-    data_list[item_num][4].append(subtask)
+    subs = list(item.subs)
+    subs.append(SubItem(subtask, item_id=store.new_id()))
+    store.set_value(item, 'subs', subs)
 
 
 def complete_sub(command_extra, data_list):
     """Mark a Subtask as complete."""
-    subcom_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    item_num = int(subcom_regex.group(1)) - 1
+    subcom_regex = ITEM_REGEX.match(command_extra)
+    item = data_list[int(subcom_regex.group(1)) - 1]
     if subcom_regex.group(2):
         sub_num = int(subcom_regex.group(2)) - 1
     else:
         sub_num = int(input("  Enter the number of the subitem")) - 1
-    data_list[item_num][4][sub_num] = data_list[item_num][4][sub_num] + '^'
+    store.set_value(item.subs[sub_num], 'done', True)
 
-    subs_done = True
-    for subitem in data_list[item_num][4]:
-        if not subitem.endswith('^'):
-            subs_done = False
-    if subs_done:
+    if store.done_counts[item.id] == len(item.subs):
         print()
         item_decision = input("  All Subitems Are Complete, Would You Like to "
                               "Mark the Item as Complete (y/n): ")
         if item_decision.lower() == 'y':
-            if data_list is task_data:
-                complete_task(item_num)
-            elif data_list is goal_data:
-                complete_goal(item_num)
+            if data_list is store.task_data:
+                complete_task(item)
+            elif data_list is store.goal_data:
+                complete_goal(item)
 
 
 def uncomplete_sub(command_extra, data_list):
     """Remove the 'completed' identifier from a Subtask."""
-    subuncom_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    item_num = int(subuncom_regex.group(1)) - 1
+    subuncom_regex = ITEM_REGEX.match(command_extra)
+    item = data_list[int(subuncom_regex.group(1)) - 1]
     if subuncom_regex.group(2):
         sub_num = int(subuncom_regex.group(2)) - 1
     else:
         sub_num = int(input("  Enter the number of the subitem")) - 1
-    data_list[item_num][4][sub_num] = data_list[item_num][4][sub_num].rstrip('^')
+    store.set_value(item.subs[sub_num], 'done', False)
 
 
-def reset_subs(task_num):
+def reset_subs(task):
     """Reset a tasks subtasks to a non-completed state"""
-    for num, subtask in enumerate(task_data[task_num][4]):
-            task_data[task_num][4][num] = subtask.rstrip('^')
+    for subtask in task.subs:
+        if subtask.done:
+            store.set_value(subtask, 'done', False)
 
 
 def delete_sub(command_extra, data_list):
     """Remove a Subtask."""
-    delcom_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    item_num = int(delcom_regex.group(1)) - 1
+    delcom_regex = ITEM_REGEX.match(command_extra)
+    item = data_list[int(delcom_regex.group(1)) - 1]
     if delcom_regex.group(2):
         sub_num = int(delcom_regex.group(2)) - 1
     else:
         sub_num = int(input("  Enter the number of the subitem: "))
-    del data_list[item_num][4][sub_num]
+    subs = list(item.subs)
+    del subs[sub_num]
+    store.set_value(item, 'subs', subs)
 
 
 def edit_sub(command_extra, data_list):
     """Change a Subtask's description."""
-    edits_regex = re.search(r'^(\d*)\s(\d*)\s?(.*)?', command_extra)
-    item_num = int(edits_regex.group(1)) - 1
-    sub_num = int(edits_regex.group(2)) - 1
-    print("  Editing: '{}'".format(data_list[item_num][4][sub_num]))
+    edits_regex = SUBITEM_REGEX.match(command_extra)
+    item = data_list[int(edits_regex.group(1)) - 1]
+    subitem = item.subs[int(edits_regex.group(2)) - 1]
+    print("  Editing: '{}'".format(subitem.text))
     if edits_regex.group(3):
-        data_list[item_num][4][sub_num] = edits_regex.group(3)
+        store.set_value(subitem, 'text', edits_regex.group(3))
     else:
         print("  Enter the new subitem description below:")
         new_desc = input("  ")
-        data_list[item_num][4][sub_num] = new_desc
+        store.set_value(subitem, 'text', new_desc)
+
+
+def date_sub(command_extra, data_list):
+    """Set or clear the due date of a Subitem."""
+    dates_regex = SUBITEM_REGEX.match(command_extra)
+    item = data_list[int(dates_regex.group(1)) - 1]
+    subitem = item.subs[int(dates_regex.group(2)) - 1]
+    command_date = dates_regex.group(3)
+    if not command_date:
+        print("  Enter Due Date For '{}': (YYYY-MM-DD or 'none')".format(subitem.text))
+        command_date = input("  ").lower()
+
+    if command_date in ('n', 'none'):
+        due = None
+    elif command_date == 't':
+        due = current_date
+    elif command_date == 'tm':
+        due = current_date + 1
+    elif command_date in DAY_NAMES:
+        due = named_day_date(command_date)
+    elif verify_date(command_date):
+        due = parse_date(command_date)
+    else:
+        return
+    store.set_value(subitem, 'due', due)
 
 
 def move_sub(command_extra, data_list):
     """Change a subitem's position in the subitem list."""
-    moves_regex = re.search(r'^(\d*)\s(\d*)\s?(\d*)?', command_extra)
-    item_num = int(moves_regex.group(1)) - 1
+    moves_regex = SUBITEM_MOVE_REGEX.match(command_extra)
+    item = data_list[int(moves_regex.group(1)) - 1]
     subitem_num = int(moves_regex.group(2)) - 1
     if moves_regex.group(3):
         new_position = int(moves_regex.group(3)) - 1
     else:
-        print("  Moving '{}'".format(data_list[item_num][4][subitem_num]))
+        print("  Moving '{}'".format(item.subs[subitem_num].text))
         new_position = int(input("  Enter the item's new position: ")) - 1
 
-    data_list[item_num][4].insert(new_position, data_list[item_num][4].pop(subitem_num))
+    subs = list(item.subs)
+    subs.insert(new_position, subs.pop(subitem_num))
+    store.set_value(item, 'subs', subs)
 
 
 # SHARED FUNCTIONS
 
-def delete_item(item_num, cache_list):
+def delete_item(item):
     """Remove an item from the task or goal list."""
-    if cache_list is deleted_tasks:
-        data_list = task_data
+    if type(item) is Task:
+        store.history.record('deleted-tasks', [('remove', item)])
         undo_com = "'undo' or 'u'"
-    elif cache_list is deleted_goals:
-        data_list = goal_data
+    else:
+        store.history.record('deleted-goals', [('remove', item)])
         undo_com = "'undo-goal' or 'ug'"
-    cache_list.append(data_list.pop(item_num))
+    store.remove_item(item)
     print("  Item deleted. Enter {} to restore.".format(undo_com))
 
 
 def move_item(command_extra, data_list):
     """Change a goal's position in the goal list."""
-    move_regex = re.search(r'^(\d*)\s?(\d*)?', command_extra)
-    item_num = int(move_regex.group(1)) - 1
+    move_regex = MOVE_REGEX.match(command_extra)
+    item = data_list[int(move_regex.group(1)) - 1]
     if move_regex.group(2):
         new_position = int(move_regex.group(2)) - 1
     else:
-        print("  Moving '{}'".format(data_list[item_num][1]))
+        print("  Moving '{}'".format(item.desc))
         new_position = int(input("  Enter the item's new position: ")) - 1
 
-    data_list.insert(new_position, data_list.pop(item_num))
+    store.remove_item(item)
+    if data_list is store.task_data:
+        # Tasks can only be reordered amongst those sharing their due date
+        new_position = max(new_position, date_range(item.due)[0])
+        new_position = min(new_position, date_range(end=item.due + 1)[1])
+    store.insert_item(data_list, new_position, item)
 
 
 def edit_desc(command_extra, data_list):
     """Update the description of a Task or Goal."""
-    edit_regex = re.search(r'^(\w*)\s?(.*)?', command_extra)
-    item_num = int(edit_regex.group(1)) - 1
+    edit_regex = ITEM_REGEX.match(command_extra)
+    item = data_list[int(edit_regex.group(1)) - 1]
 
     if edit_regex.group(2):
-        data_list[item_num][1] = edit_regex.group(2)
+        store.set_value(item, 'desc', edit_regex.group(2))
     else:
-        print("  Editing: '{}'".format(data_list[item_num][1]))
+        print("  Editing: '{}'".format(item.desc))
         print("  Enter the new description below:")
         new_desc = input("  ")
-        data_list[item_num][1] = new_desc
-
+        store.set_value(item, 'desc', new_desc)
+
+
+def undo_action(kind):
+    """Undo the last completion or deletion of a kind recorded in the history,
+    such as 'deleted-tasks', along with everything done by the same command."""
+    changes = store.history.undo(kind)
+    # The IDs of the completed items to take out of the archive, by month
+    archived = {}
+    for change in reversed(changes):
+        if change[0] == 'remove':
+            item = change[1]
+            if item.id in store.item_index:
+                continue
+            if type(item) is Task:
+                store.insert_task(item)
+            else:
+                store.insert_item(store.goal_data, len(store.goal_data), item)
+            if kind.startswith('completed'):
+                # Completions recorded before their date was kept are searched for
+                month = format_date(change[2])[:7] if len(change) > 2 else None
+                archived.setdefault(month, []).append(item.id)
+        else:
+            _, task_id, old_due, _, sub_ids = change
+            move_completed(task_id, old_due, sub_ids, True)
+    for month, item_ids in archived.items():
+        store.archive.restore_many(item_ids, month)
+
+
+def redo_action(kind):
+    """Redo the last undone completion or deletion of a kind."""
+    changes = store.history.redo(kind)
+    revised = list(changes)
+    removed = False
+    for position, change in enumerate(changes):
+        if change[0] == 'remove':
+            item = store.item_index.get(change[1].id)
+            if item is None:
+                continue
+            # Keep whatever was changed since the undo for the next undo
+            revised[position] = ('remove', item)
+            removed = True
+            store.remove_item(item)
+            if kind.startswith('completed'):
+                store.archive.add(item)
+                revised[position] = ('remove', item, current_date)
+        else:
+            _, task_id, _, new_due, sub_ids = change
+            move_completed(task_id, new_due, sub_ids, False)
+    if removed:
+        store.history.revise(kind, revised)
+
+
+def restore_archived(command_extra):
+    """Move a Task or Goal listed by 'ls done' out of the archive and back
+    onto its list."""
+    month, _, item_num = command_extra.partition(' ')
+    if not MONTH_REGEX.match(month):
+        print("  Enter the Month and Number Shown by 'ls done' e.g. restore 2026-09 3.")
+        return
+    _, item = store.archive.month_items(month)[int(item_num) - 1]
+    store.archive.restore(item.id, month)
+    if item.id in store.item_index:
+        return
+    if type(item) is Task:
+        store.insert_task(item)
+    else:
+        store.insert_item(store.goal_data, len(store.goal_data), item)
+    print("  '{}' Restored From the Archive.".format(item.desc))
 
-def undo_action(cache_list):
-    """Restore the last deleted or completed Task or Goal to the task list."""
-    if cache_list is completed_tasks or cache_list is deleted_tasks:
-        data_list = task_data
-    elif cache_list is completed_goals or cache_list is deleted_goals:
-        data_list = goal_data
 
-    # Check for a repeat flag. If found delete matching task before restoring
-    if cache_list == completed_tasks and completed_tasks[-1][3] != '':
-        description = completed_tasks[-1][1]
-        for task in task_data:
-            if description == task[1]:
-                del task_data[int(task[0]) - 1]
-                break
-    data_list.append(cache_list.pop(-1))
+def move_completed(task_id, due, sub_ids, done):
+    """Move a repeating Task to a due date either side of its completion,
+    setting the Subtasks its completion reset."""
+    task = store.item_index.get(task_id)
+    if task is None:
+        return
+    store.set_due(task, due)
+    for sub_id in sub_ids:
+        if sub_id in store.item_index:
+            store.set_value(store.item_index[sub_id], 'done', done)
 
 
 def add_tag(command_extra, data_list):
     """Add tag(s) to a Task or Goal."""
-    tag_regex = re.search(r'^(\d*)\s?(.*)?', command_extra)
-    item_num = int(tag_regex.group(1)) - 1
+    tag_regex = TAG_ADD_REGEX.match(command_extra)
+    item = data_list[int(tag_regex.group(1)) - 1]
     command_tag = tag_regex.group(2)
     if command_tag:
         tags = command_tag.split(',')
@@ -952,55 +1285,1766 @@ def add_tag(command_extra, data_list):
         print("  Enter your tag(s) here. If multiple, seperate them with a comma:")
         tags = input("  ").split(',')
 
-    for tag in tags:
-            data_list[item_num][5].append(tag)
+    store.set_value(item, 'tags', list(item.tags) + tags)
     print("  Tags Successfully Added to Item")
 
 
 def remove_tag(command_extra, data_list):
     """Remove a tag from an item."""
     extra_list = command_extra.split(' ')
-    item_num = int(extra_list[0]) - 1
+    item = data_list[int(extra_list[0]) - 1]
     to_remove = extra_list[1]
 
     if len(extra_list) == 2 and extra_list[1].lower() == 'all':
-        remove_value(data_list, item_num, 5)
+        remove_value(item, 'tags')
         print("  All Tags for This Item Have Been Removed.")
         return
 
-    data_list[item_num][5].remove(to_remove)
+    tags = list(item.tags)
+    tags.remove(to_remove)
+    store.set_value(item, 'tags', tags)
     print("  Tag Successfully Removed.")
 
 
-def remove_value(data_list, task_num, value_position):
+def remove_value(item, value_name):
     """Remove a value from a Task or Goal."""
-    if value_position == 5:
-        overwrite_value = []
+    if value_name == 'tags':
+        overwrite_value = ()
     else:
         overwrite_value = ''
-    data_list[task_num][value_position] = overwrite_value
+    store.set_value(item, value_name, overwrite_value)
 
 
-def update_order():
-    """Update the numbering of the Tasks and Goals."""
-    task_data.sort(key=lambda x: x[2])
-    count = 1
-    for task in task_data:
-        task[0] = count
-        count += 1
+# IMPORT AND EXPORT FUNCTIONS
 
-    for num, goal in enumerate(goal_data, 1):
-        goal[0] = num
+def export_data(file_name):
+    """Write every Task and Goal along with their Subitems and tags to a JSON
+    Lines file, or to a CSV file if its name ends in .csv."""
+    if not file_name:
+        print("  Enter the File to Export to e.g. export tasks.jsonl")
+        return
+    try:
+        fp = open(file_name, 'w', newline='')
+    except OSError:
+        print("  Could Not Write to {}.".format(file_name))
+        return
+    # Rows are written as they're made so the whole file is never held at once
+    with fp:
+        if file_name.lower().endswith('.csv'):
+            writer = csv.DictWriter(fp, EXPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(export_rows())
+        else:
+            for row in export_rows():
+                fp.write(json.dumps({field: value for field, value in row.items()
+                                     if value not in ('', False)}) + '\n')
+    print("  Tasks and Goals Exported to {}.".format(file_name))
+
+
+def export_rows():
+    """Yield a row for each Task and Goal, each followed by a row for each of
+    its Subitems."""
+    for item in chain(store.task_data, store.goal_data):
+        if type(item) is Task:
+            repeat = item.repeat
+            if type(repeat) is list:
+                repeat = ','.join(repeat)
+            yield {'type': 'task', 'desc': item.desc, 'due': format_date(item.due),
+                   'repeat': str(repeat), 'tags': ','.join(item.tags)}
+        else:
+            yield {'type': 'goal', 'desc': item.desc, 'target': item.target,
+                   'percent': str(item.percent), 'tags': ','.join(item.tags)}
+        for sub in item.subs:
+            yield {'type': 'sub', 'desc': sub.text, 'done': sub.done,
+                   'due': '' if sub.due is None else format_date(sub.due)}
+
+
+def import_data(file_name):
+    """Add the Tasks and Goals in a file written by 'export', checking every
+    row without prompting and skipping any that aren't valid."""
+    if not file_name:
+        print("  Enter the File to Import From e.g. import tasks.jsonl")
+        return
+    try:
+        fp = open(file_name, newline='')
+    except OSError:
+        print("  Could Not Open {}.".format(file_name))
+        return
+    tasks, goals, problems = [], [], []
+    # The Task or Goal the Subitem rows that follow belong to
+    item = None
+    with fp:
+        for line_num, row in read_rows(fp, file_name.lower().endswith('.csv')):
+            try:
+                record = import_record(row)
+            except ValueError as error:
+                problems.append((line_num, str(error)))
+                if row is None or row.get('type') != 'sub':
+                    item = None
+                continue
+            if type(record) is not SubItem:
+                item = record
+                (tasks if type(record) is Task else goals).append(record)
+            elif item is None:
+                problems.append((line_num, "No Task or Goal to Add the Subitem to."))
+            else:
+                if not item.subs:
+                    item.subs = []
+                item.subs.append(record)
+
+    store.insert_tasks(tasks)
+    for goal in goals:
+        store.insert_item(store.goal_data, len(store.goal_data), goal)
+    print("  {} Tasks and {} Goals Imported From {}.".format(len(tasks), len(goals),
+                                                           file_name))
+    for line_num, problem in problems[:IMPORT_PROBLEMS_SHOWN]:
+        print("  Line {} Skipped: {}".format(line_num, problem))
+    if len(problems) > IMPORT_PROBLEMS_SHOWN:
+        print("  ...and {} More Lines Skipped.".format(len(problems) - IMPORT_PROBLEMS_SHOWN))
+
+
+def read_rows(fp, is_csv):
+    """Yield the line number and fields of each row of an exported file as
+    it's read, with None for any line that isn't a row."""
+    if is_csv:
+        reader = csv.DictReader(fp)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if type(row) is dict else None
+
+
+def import_record(row):
+    """Return the Task, Goal or Subitem an exported row describes, raising
+    ValueError with the reason if the row isn't valid."""
+    if row is None:
+        raise ValueError("Not a Row Written by 'export'.")
+    kind, desc = row.get('type'), row.get('desc')
+    if kind not in ('task', 'goal', 'sub'):
+        raise ValueError("Type Must Be task, goal or sub.")
+    if not desc:
+        raise ValueError("Description Missing.")
+    desc = str(desc)
+    due_text = row.get('due') or ''
+    if due_text and not date_is_valid(due_text):
+        raise ValueError("Date Entered Doesn't Match the Required (YYYY-MM-DD) Format.")
+    due = parse_date(due_text) if due_text else None
+
+    if kind == 'sub':
+        done = str(row.get('done')).lower() in ('true', 'yes', '1')
+        return SubItem(desc, done, store.new_id(), due)
+    # Empty tag fields, left out of JSON Lines rows, mean no tags
+    tags = row.get('tags') or []
+    if type(tags) is str:
+        tags = [tag for tag in tags.split(',') if tag]
+    elif type(tags) is not list or not all(type(tag) is str for tag in tags):
+        raise ValueError("Tags Must Be Text Separated by Commas.")
+    if kind == 'task':
+        repeat = str(row.get('repeat') or '').lower()
+        if repeat:
+            repeat = parse_repeat(repeat)
+            problem = repeat_problem(repeat)
+            if problem:
+                raise ValueError(problem)
+        # Tasks without a due date are due today, as when added
+        due = current_date if due is None else due
+        return Task(desc, due, pin_repeat(repeat, due), (),
+                    list(tags) or (), store.new_id())
+    percent = str(row.get('percent') or 'auto')
+    if percent != 'auto':
+        if not percent.isdigit() or int(percent) > 100:
+            raise ValueError("Percentage Must Be auto or a Whole Number up to 100.")
+        percent = int(percent)
+    return Goal(desc, str(row.get('target') or ''), percent, (), list(tags) or (),
+                store.new_id())
+
+
+# STORAGE
+
+class Store:
+    """The Tasks and Goals along with the indexes used to look them up.
+
+    Subclasses decide how the data is kept by providing load_data(),
+    record_change() and save_changes(). Nothing is read until the data is
+    first used, so opening a Store and importing Todoian cost next to
+    nothing.
+
+    Several processes can share a data file. Each remembers the version of
+    the saved data it loaded, and refresh() loads it again before a command
+    if another process has saved changes since.
+    """
+
+    # Attributes that are only set once the data has been loaded
+    LOADED = ('task_data', 'goal_data', 'item_index', 'tag_index', 'parent_index',
+              'done_counts', 'word_index', 'sorted_words', 'next_id', 'version')
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.history = History(os.path.splitext(data_file)[0] + '.history')
+        self.archive = Archive(os.path.splitext(data_file)[0] + '.archive')
+        # Bytes written by saves so far, for the command stats
+        self.bytes_written = 0
+
+    def __getattr__(self, name):
+        if name not in self.LOADED or 'task_data' in vars(self):
+            raise AttributeError(name)
+        self.load_data()
+        return getattr(self, name)
+
+    def insert_task(self, task):
+        """Insert a Task after any others sharing its due date."""
+        position = bisect_right(self.task_data, task.due, key=attrgetter('due'))
+        self.insert_item(self.task_data, position, task)
+
+    def insert_tasks(self, tasks):
+        """Merge new Tasks into task_data after any others sharing their due
+        dates, sorting the new Tasks once rather than inserting each in turn."""
+        if not tasks:
+            return
+        tasks.sort(key=attrgetter('due'))
+        new_ids = {task.id for task in tasks}
+        self.task_data[:] = merge(self.task_data, tasks, key=attrgetter('due'))
+        inserted = []
+        for position, task in enumerate(self.task_data):
+            if task.id in new_ids:
+                self.index_item(task)
+                inserted.append((position, task))
+        # One record for them all, with positions in order so replaying the
+        # insertions one by one rebuilds the merged list
+        self.record_change('merge', 'task', inserted)
+
+    def set_due(self, task, due):
+        """Change the due date of a Task, moving it to keep task_data sorted."""
+        self.remove_item(task)
+        # Land where a stable sort would, ahead of Tasks already due on a later
+        # date but behind those due on an earlier date
+        if due > task.due:
+            position = bisect_left(self.task_data, due, key=attrgetter('due'))
+        else:
+            position = bisect_right(self.task_data, due, key=attrgetter('due'))
+        task.due = due
+        self.insert_item(self.task_data, position, task)
+
+    def reschedule(self, first, last, new_dates):
+        """Give the Tasks between two positions in task_data new due dates,
+        merging them back into the list in a single pass.
+
+        A new date of None removes the Task instead.
+        """
+        changes = [(task.id, new_date) for task, new_date
+                   in zip(self.task_data[first:last], new_dates)]
+        self.move_tasks(first, changes)
+        self.record_change('reschedule', changes)
+
+    def move_tasks(self, first, changes):
+        """Apply a reschedule to the Tasks from a position in task_data."""
+        last = first + len(changes)
+        moved = []
+        for task, (_, new_date) in zip(self.task_data[first:last], changes):
+            if new_date is None:
+                self.unindex_item(task)
+            else:
+                task.due = new_date
+                moved.append(task)
+        del self.task_data[first:last]
+        # Moved Tasks were ahead of every Task they now share a due date with,
+        # so they stay ahead of them as they would in a stable sort
+        moved.sort(key=attrgetter('due'))
+        self.task_data[:] = merge(moved, self.task_data, key=attrgetter('due'))
+
+    def new_id(self):
+        """Return an unused ID for a new Task, Goal or Subitem."""
+        self.next_id += 1
+        return self.next_id - 1
+
+    def index_item(self, item, words=True):
+        """Add a Task or Goal and its Subitems, tags and words to the lookup indexes."""
+        self.item_index[item.id] = item
+        for sub in item.subs:
+            self.item_index[sub.id] = sub
+            self.parent_index[sub.id] = item
+        self.done_counts[item.id] = sum(sub.done for sub in item.subs)
+        for tag in item.tags:
+            self.tag_index.setdefault(tag, set()).add(item.id)
+        if words:
+            self.index_words(item)
+
+    def unindex_item(self, item):
+        """Remove a Task or Goal and its Subitems, tags and words from the lookup indexes."""
+        del self.item_index[item.id]
+        for sub in item.subs:
+            del self.item_index[sub.id]
+            del self.parent_index[sub.id]
+        del self.done_counts[item.id]
+        for tag in item.tags:
+            self.untag_id(tag, item.id)
+        self.unindex_words(item)
+
+    def untag_id(self, tag, item_id):
+        """Remove an item ID from a tag's entry in the tag index."""
+        tagged = self.tag_index.get(tag)
+        if tagged is not None:
+            tagged.discard(item_id)
+            if not tagged:
+                del self.tag_index[tag]
+
+    def index_words(self, item):
+        """Add the words of a Task or Goal to the search index."""
+        for word, weight in item_words(item).items():
+            if word not in self.word_index:
+                self.word_index[word] = {}
+                insort(self.sorted_words, word)
+            self.word_index[word][item.id] = weight
+
+    def unindex_words(self, item):
+        """Remove the words of a Task or Goal from the search index."""
+        for word in item_words(item):
+            weights = self.word_index[word]
+            del weights[item.id]
+            if not weights:
+                del self.word_index[word]
+                del self.sorted_words[bisect_left(self.sorted_words, word)]
+
+    def word_search(self, query):
+        """Return the IDs of the items matching a search, best matches first.
+
+        Each search term matches any word it is a prefix of. Items matching the
+        most terms come first, followed by those whose words match more often,
+        in their descriptions or as whole words.
+        """
+        scores = {}
+        for term in WORD_REGEX.findall(query.lower()):
+            term_scores = {}
+            position = bisect_left(self.sorted_words, term)
+            while (position < len(self.sorted_words)
+                   and self.sorted_words[position].startswith(term)):
+                word = self.sorted_words[position]
+                bonus = 1 if word == term else 0
+                for item_id, weight in self.word_index[word].items():
+                    term_scores[item_id] = max(term_scores.get(item_id, 0), weight + bonus)
+                position += 1
+            for item_id, score in term_scores.items():
+                terms, total = scores.get(item_id, (0, 0))
+                scores[item_id] = (terms + 1, total + score)
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def tasks_due(self, start=None, end=None):
+        """Yield the list position and record of each Task due from the start
+        date up to, but not including, the end date."""
+        first = 0 if start is None else bisect_left(self.task_data, start,
+                                                    key=attrgetter('due'))
+        last = len(self.task_data) if end is None else bisect_left(
+            self.task_data, end, lo=first, key=attrgetter('due'))
+        for position in range(first, last):
+            yield position, self.task_data[position]
+
+    def tagged_ids(self, tag):
+        """Return the IDs of the Tasks and Goals with a tag."""
+        return self.tag_index.get(tag, set())
+
+    def item_position(self, item):
+        """Return the current list position of a Task or Goal."""
+        if type(item) is not Task:
+            return self.goal_data.index(item)
+        # Only Tasks sharing its due date need to be checked
+        position = bisect_left(self.task_data, item.due, key=attrgetter('due'))
+        while self.task_data[position] is not item:
+            position += 1
+        return position
+
+    def insert_item(self, data_list, position, item):
+        """Insert a Task or Goal into its list and journal the change."""
+        data_list.insert(position, item)
+        self.index_item(item)
+        self.record_change('insert', self.list_name(data_list), position, item)
+
+    def remove_item(self, item):
+        """Remove a Task or Goal from its list and journal the change."""
+        if type(item) is Task:
+            self.task_data.pop(self.item_position(item))
+        else:
+            self.goal_data.pop(self.item_position(item))
+        self.unindex_item(item)
+        self.record_change('remove', item.id)
+
+    def clear_items(self, data_list):
+        """Remove every item from the task or goal list."""
+        for item in data_list:
+            self.unindex_item(item)
+        data_list.clear()
+        self.record_change('clear', self.list_name(data_list))
+
+    def set_value(self, record, value_name, value):
+        """Set a value of a Task, Goal or Subitem and journal the change."""
+        self.reindex_value(record, value_name, value)
+        self.record_change('update', record.id, value_name, value)
+
+    def reindex_value(self, record, value_name, value):
+        """Set a value of a Task, Goal or Subitem, keeping the indexes in step."""
+        if value_name == 'tags':
+            for tag in record.tags:
+                self.untag_id(tag, record.id)
+            for tag in value:
+                self.tag_index.setdefault(tag, set()).add(record.id)
+            record.tags = value
+            return
+        if value_name == 'done':
+            self.done_counts[self.parent_index[record.id].id] += bool(value) - bool(record.done)
+        if value_name not in ('desc', 'subs', 'text'):
+            setattr(record, value_name, value)
+            return
+
+        # The words of a Task or Goal include those of its Subitems
+        item = self.parent_index[record.id] if type(record) is SubItem else record
+        self.unindex_words(item)
+        if value_name == 'subs':
+            for sub in record.subs:
+                del self.item_index[sub.id]
+                del self.parent_index[sub.id]
+            for sub in value:
+                self.item_index[sub.id] = sub
+                self.parent_index[sub.id] = record
+            self.done_counts[record.id] = sum(sub.done for sub in value)
+        setattr(record, value_name, value)
+        self.index_words(item)
+
+    def list_name(self, data_list):
+        """Return the name used in the journal for the task or goal list."""
+        if data_list is self.task_data:
+            return 'task'
+        return 'goal'
+
+    def reset_indexes(self):
+        """Empty the lookup indexes ready for the data to be loaded."""
+        # Tasks, Goals and Subitems by ID, along with the next ID to be given out
+        self.item_index = {}
+        self.next_id = 1
+        # Sets of the IDs of the Tasks and Goals carrying each tag
+        self.tag_index = {}
+        # The Task or Goal holding each Subitem, by Subitem ID
+        self.parent_index = {}
+        # The number of completed Subitems of each Task and Goal, by ID
+        self.done_counts = {}
+        # The search weight of each word for the IDs of the Tasks and Goals
+        # using it, along with every indexed word in order for prefix matches
+        self.word_index = {}
+        self.sorted_words = []
+
+    def load_data(self):
+        """Load the task and goal lists and build the lookup indexes."""
+        raise NotImplementedError
+
+    def record_change(self, *change):
+        """Keep a change to the task or goal lists until the next save."""
+        raise NotImplementedError
+
+    def save_changes(self):
+        """Make the changes recorded since the last save permanent."""
+        raise NotImplementedError
+
+    def discard_changes(self):
+        """Drop the changes recorded since the last save."""
+        raise NotImplementedError
+
+    def has_unsaved_changes(self):
+        """Return whether changes have been recorded since the last save."""
+        raise NotImplementedError
+
+    def saved_elsewhere(self):
+        """Return whether another process has saved changes to the data file
+        since the data was loaded."""
+        raise NotImplementedError
+
+    def refresh(self):
+        """Load the data again when it's next used if another process has
+        saved changes to it, unless that would lose unsaved changes here."""
+        if ('task_data' in vars(self) and not self.has_unsaved_changes()
+                and self.saved_elsewhere()):
+            self.rollback()
+
+    def rollback(self):
+        """Undo every change made since the last save by dropping them and
+        loading the saved data again when it's next used."""
+        self.discard_changes()
+        for name in self.LOADED:
+            vars(self).pop(name, None)
+        self.history = History(self.history.history_file, self.history.capacity)
+        self.archive = Archive(self.archive.archive_dir)
+
+
+class PickleStore(Store):
+    """Tasks and Goals kept in a pickled data file snapshot with a journal of
+    the changes made since.
+
+    Saves hold a lock on the data file so processes sharing it take turns,
+    while loading never waits for one. The version of the saved data is the
+    identity of the snapshot and the length of the journal, so a save that
+    finds either changed merges its changes with the other process's instead
+    of writing over them.
+    """
+
+    LOADED = Store.LOADED + ('generation', 'journal_stale')
+
+    def __init__(self, data_file):
+        super().__init__(data_file)
+        self.journal_file = os.path.splitext(data_file)[0] + '.journal'
+        self.index_file = os.path.splitext(data_file)[0] + '.index'
+        self.lock_file = os.path.splitext(data_file)[0] + '.lock'
+        # Pickled changes waiting to be appended to the journal
+        self.pending_changes = []
+        # The saved Subitems or tags of each list changed since, by item ID
+        # and value name, so a merge can tell what was changed here
+        self.merge_bases = {}
+        # The open lock file while the lock is held, and how many times it's held
+        self.lock_fp = None
+        self.lock_depth = 0
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock on the data file, waiting for any other process
+        saving to it to finish first."""
+        if self.lock_depth == 0 and fcntl is not None:
+            self.lock_fp = open(self.lock_file, 'a')
+            fcntl.flock(self.lock_fp, fcntl.LOCK_EX)
+        self.lock_depth += 1
+        try:
+            yield
+        finally:
+            self.lock_depth -= 1
+            if self.lock_depth == 0 and self.lock_fp is not None:
+                # Closing the file releases the lock
+                self.lock_fp.close()
+                self.lock_fp = None
+
+    def disk_version(self):
+        """Return the version of the saved data: the inode, modification time
+        and size of the snapshot, followed by the length of the journal."""
+        snapshot = os.stat(self.data_file)
+        try:
+            journal_size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            journal_size = 0
+        return (snapshot.st_ino, snapshot.st_mtime_ns, snapshot.st_size, journal_size)
+
+    def saved_elsewhere(self):
+        """Return whether the snapshot or journal has changed since the data
+        was loaded or last saved here."""
+        return self.disk_version() != self.version
+
+    def has_unsaved_changes(self):
+        """Return whether changes are waiting to be appended to the journal."""
+        return bool(self.pending_changes)
+
+    def set_value(self, record, value_name, value):
+        """Set a value of a Task, Goal or Subitem and journal the change,
+        keeping the saved list it replaces when it's the Subitems or tags."""
+        if value_name in ('subs', 'tags'):
+            self.merge_bases.setdefault((record.id, value_name), [
+                list_key(value_name, element) for element in getattr(record, value_name)])
+        super().set_value(record, value_name, value)
+
+    def record_change(self, *change):
+        """Queue a change to be appended to the journal on the next save."""
+        # Pickled straight away so later in place edits can't alter the record
+        self.pending_changes.append(pickle.dumps(change, pickle.HIGHEST_PROTOCOL))
+
+    def replay_change(self, change):
+        """Apply a change read from the journal to the task and goal lists."""
+        action = change[0]
+        if action == 'order':
+            # Journals used to record a full sort after most commands
+            self.task_data.sort(key=attrgetter('due'))
+            return
+        if action == 'remove':
+            item = self.item_index[change[1]]
+            if type(item) is Task:
+                self.task_data.pop(self.item_position(item))
+            else:
+                self.goal_data.pop(self.item_position(item))
+            self.unindex_item(item)
+            return
+        if action == 'update':
+            record, value_name, value = self.item_index[change[1]], change[2], change[3]
+            self.reindex_value(record, value_name, value)
+            if value_name == 'subs':
+                for sub in value:
+                    self.next_id = max(self.next_id, sub.id + 1)
+            return
+
+        if change[1] == 'task':
+            data_list, item_class = self.task_data, Task
+        else:
+            data_list, item_class = self.goal_data, Goal
+        if action == 'insert':
+            item = self.upgrade_item(change[3], item_class)
+            data_list.insert(change[2], item)
+            self.index_item(item)
+        elif action == 'clear':
+            for item in data_list:
+                self.unindex_item(item)
+            data_list.clear()
+        elif action == 'merge':
+            for position, item in change[2]:
+                item = self.upgrade_item(item, item_class)
+                data_list.insert(position, item)
+                self.index_item(item)
+        elif action == 'reschedule':
+            self.move_tasks(self.item_position(self.item_index[change[1][0][0]]),
+                            change[1])
+        # Journals written before IDs were introduced recorded list positions
+        elif action == 'pop':
+            self.unindex_item(data_list.pop(change[2]))
+        elif action == 'set':
+            value_name = change[3]
+            if type(value_name) is int:
+                # Journals written before record classes used list positions
+                value_name = (('num',) + item_class.__slots__)[value_name]
+            item = data_list[change[2]]
+            self.unindex_item(item)
+            setattr(item, value_name, change[4])
+            self.index_item(self.upgrade_item(item, item_class))
+
+    def upgrade_item(self, item, item_class):
+        """Convert a Task or Goal saved by an earlier version to the current
+        format, returning the upgraded item."""
+        if type(item) is list:
+            # Items used to be lists holding their number and then their values
+            item = item_class(*item[1:])
+        if item.subs and type(item.subs[0]) is str:
+            # Completed Subitems used to be marked with a trailing '^'
+            item.subs = [SubItem(sub.rstrip('^'), sub.endswith('^'))
+                         for sub in item.subs]
+        if not item.tags:
+            item.tags = ()
+        # Due dates used to be stored as YYYY-MM-DD strings
+        if item_class is Task and type(item.due) is str:
+            item.due = parse_date(item.due)
+        # Items and Subitems saved before IDs were introduced are given one
+        for record in [item] + list(item.subs):
+            if record.id is None:
+                record.id = self.new_id()
+            else:
+                self.next_id = max(self.next_id, record.id + 1)
+        return item
+
+    def save_changes(self):
+        """Append pending changes to the journal, compacting it when needed,
+        or merge them with the changes another process has saved since the
+        data was loaded."""
+        with self.locked():
+            # Merged first, as the merge can renumber items the history and
+            # archive refer to
+            if self.pending_changes and self.saved_elsewhere():
+                self.merge_changes()
+            self.bytes_written += self.history.save() + self.archive.save()
+            if not self.pending_changes:
+                return
+            if self.journal_stale:
+                self.discard_changes()
+                self.compact_journal()
+                return
+            if not os.path.exists(self.journal_file):
+                record = pickle.dumps(('generation', self.generation), pickle.HIGHEST_PROTOCOL)
+                self.pending_changes.insert(0, record)
+            journal_data = b''.join(self.pending_changes)
+            with open(self.journal_file, 'ab') as fp:
+                fp.write(journal_data)
+            self.bytes_written += len(journal_data)
+            self.discard_changes()
+            self.version = self.disk_version()
+
+            journal_size = self.version[-1]
+            snapshot_age = time.time() - os.path.getmtime(self.data_file)
+            if journal_size > JOURNAL_MAX_BYTES or snapshot_age > JOURNAL_MAX_AGE:
+                self.compact_journal()
+
+    def merge_changes(self):
+        """Load the data saved by another process, replay the pending changes
+        on top of it and save the result as a fresh snapshot."""
+        changes = [pickle.loads(record) for record in self.pending_changes]
+        self.pending_changes.clear()
+        for name in self.LOADED:
+            vars(self).pop(name, None)
+        self.load_data()
+        new_ids = {}
+        for change in changes:
+            self.merge_change(change, new_ids)
+        self.merge_bases.clear()
+        if new_ids:
+            self.history.remap(new_ids)
+            self.archive.remap(new_ids)
+        self.compact_journal()
+        print("  Changes Saved by Another Todoian Were Merged With These.")
+
+    def merge_change(self, change, new_ids):
+        """Replay a pending change on data another process has changed since
+        it was made.
+
+        New items whose IDs were given out by the other process get fresh
+        ones, recorded in new_ids so later changes to them follow, and changes
+        to items the other process has removed are skipped.
+        """
+        action = change[0]
+        if action == 'insert':
+            item = change[3]
+            for record in [item] + list(item.subs):
+                if record.id in self.item_index:
+                    new_ids[record.id] = record.id = self.new_id()
+                else:
+                    self.next_id = max(self.next_id, record.id + 1)
+            # The recorded position may be out of date, but due dates aren't
+            if type(item) is Task:
+                position = bisect_right(self.task_data, item.due, key=attrgetter('due'))
+                self.task_data.insert(position, item)
+            else:
+                self.goal_data.insert(change[2], item)
+            self.index_item(item)
+        elif action == 'reschedule':
+            # The Tasks may no longer sit together, so each is moved on its own
+            moved = []
+            for task_id, new_date in change[1]:
+                task = self.item_index.get(new_ids.get(task_id, task_id))
+                if task is None:
+                    continue
+                self.task_data.pop(self.item_position(task))
+                if new_date is None:
+                    self.unindex_item(task)
+                else:
+                    task.due = new_date
+                    moved.append(task)
+            moved.sort(key=attrgetter('due'))
+            self.task_data[:] = merge(moved, self.task_data, key=attrgetter('due'))
+        elif action == 'merge':
+            for position, item in change[2]:
+                self.merge_change(('insert', change[1], position, item), new_ids)
+        elif action == 'clear':
+            self.replay_change(change)
+        else:
+            item_id = new_ids.get(change[1], change[1])
+            record = self.item_index.get(item_id)
+            if record is None:
+                return
+            if action != 'update' or change[2] not in ('subs', 'tags'):
+                self.replay_change((action, item_id) + change[2:])
+                return
+            value_name, value = change[2], change[3]
+            base = self.merge_bases.get((change[1], value_name), [])
+            if value_name == 'subs':
+                base = [new_ids.get(sub_id, sub_id) for sub_id in base]
+                for sub in value:
+                    sub.id = new_ids.get(sub.id, sub.id)
+                    # Subitems added here may share IDs with ones added there
+                    if sub.id in self.item_index and (sub.id not in base or
+                                                      self.parent_index.get(sub.id) is not record):
+                        new_ids[sub.id] = sub.id = self.new_id()
+            # Only the Subitems or tags added, removed or moved here are
+            # applied, keeping those the other process changed
+            value = merge_list(base, value, getattr(record, value_name),
+                               functools.partial(list_key, value_name))
+            self.replay_change((action, item_id, value_name, value))
+
+    def discard_changes(self):
+        """Drop the changes waiting to be appended to the journal."""
+        self.pending_changes.clear()
+        self.merge_bases.clear()
+
+    def compact_journal(self):
+        """Fold the journal into a fresh snapshot of the data file."""
+        with self.locked():
+            self.generation += 1
+            temp_file = self.data_file + '.tmp'
+            with open(temp_file, 'wb') as fp:
+                if len(self.task_data) >= COLUMNAR_MIN_TASKS:
+                    pickle.dump(pack_tasks(self.task_data), fp, pickle.HIGHEST_PROTOCOL)
+                else:
+                    pickle.dump(self.task_data, fp, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.goal_data, fp, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.generation, fp, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.next_id, fp, pickle.HIGHEST_PROTOCOL)
+            # Replacing rather than rewriting means processes loading the old
+            # snapshot carry on reading it undisturbed
+            os.replace(temp_file, self.data_file)
+            # Saved after the snapshot so a crash in between only leaves it stale
+            with open(temp_file, 'wb') as fp:
+                pickle.dump((self.generation, self.word_index, self.sorted_words), fp,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.index_file)
+            self.bytes_written += (os.path.getsize(self.data_file)
+                                   + os.path.getsize(self.index_file))
+            # A journal left behind by a crash here is ignored as its generation is old
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self.journal_stale = False
+            self.version = self.disk_version()
+
+    def load_data(self):
+        """Load the data file snapshot and replay any journaled changes on top."""
+        self.reset_indexes()
+        with open(self.data_file, 'rb') as fp:
+            # Taken from the open file in case another process replaces it meanwhile
+            snapshot = os.fstat(fp.fileno())
+            self.task_data = load_record(fp)
+            self.goal_data = load_record(fp)
+            try:
+                self.generation = load_record(fp)
+            except EOFError:
+                # Data files written before journaling have no generation
+                self.generation = 0
+            try:
+                self.next_id = load_record(fp)
+                upgraded = False
+            except EOFError:
+                # Data files written before IDs need them given out and saved
+                upgraded = True
+        if type(self.task_data) is dict:
+            self.task_data = unpack_tasks(self.task_data)
+        if upgraded:
+            self.task_data = [self.upgrade_item(task, Task) for task in self.task_data]
+            self.goal_data = [self.upgrade_item(goal, Goal) for goal in self.goal_data]
+            # Earlier versions could save Tasks out of due date order, which
+            # the bisecting lookups can't cope with
+            self.task_data.sort(key=attrgetter('due'))
+        # The search index saved with the snapshot saves indexing every word
+        words_saved = False
+        if not upgraded and os.path.exists(self.index_file):
+            with open(self.index_file, 'rb') as fp:
+                try:
+                    index_generation, saved_index, saved_words = load_record(fp)
+                    if index_generation == self.generation:
+                        self.word_index.update(saved_index)
+                        self.sorted_words.extend(saved_words)
+                        words_saved = True
+                except (EOFError, pickle.UnpicklingError):
+                    pass
+        for item in self.task_data + self.goal_data:
+            self.index_item(item, words=not words_saved)
+
+        # The length of the journal read, and whether it was left behind by an
+        # earlier snapshot so has to be compacted away rather than appended to
+        journal_read = 0
+        self.journal_stale = False
+        if os.path.exists(self.journal_file):
+            journal_size = os.path.getsize(self.journal_file)
+            with open(self.journal_file, 'rb') as fp:
+                try:
+                    if load_record(fp) != ('generation', self.generation):
+                        journal_read = journal_size
+                        self.journal_stale = True
+                    else:
+                        journal_read = fp.tell()
+                        while journal_read < journal_size:
+                            self.replay_change(load_record(fp))
+                            journal_read = fp.tell()
+                except (EOFError, pickle.UnpicklingError):
+                    # A record still being written by another process, or one
+                    # left partly written by an interrupted save, which the
+                    # next save merges or compacts away
+                    pass
+        self.version = (snapshot.st_ino, snapshot.st_mtime_ns, snapshot.st_size,
+                        journal_read)
+        if upgraded:
+            self.compact_journal()
+
+
+class SqliteStore(Store):
+    """Tasks and Goals kept in an SQLite database, with each change written
+    to just the rows it affects.
+
+    Tasks and Goals are kept in list order by a rank, with new items ranked
+    between their neighbours, and the due date and tag columns are indexed
+    so the date and tag views query the database directly.
+
+    Changes are written to the database together when they're saved, so
+    its write lock is only held while saving and processes sharing it never
+    wait on one another's unsaved changes. IDs are reserved in blocks that
+    are committed straight away for the same reason.
+    """
+
+    def __init__(self, data_file):
+        super().__init__(data_file)
+        self.connection = None
+        # The rank of each Task and Goal, by ID
+        self.ranks = {}
+        # The statements waiting to be run on the next save, with their values
+        self.pending_statements = []
+        # The first ID past the block reserved by this process
+        self.reserved_id = 0
+
+    def connect(self):
+        """Return the database connection, creating the tables if needed."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.data_file)
+            # Lets processes sharing the database read while another writes
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(SQLITE_SCHEMA)
+            # Databases created before Subitems had due dates lack the column
+            columns = [row[1] for row in
+                       self.connection.execute('PRAGMA table_info(subitems)')]
+            if 'due' not in columns:
+                self.connection.execute('ALTER TABLE subitems ADD COLUMN due INTEGER')
+        return self.connection
+
+    def load_data(self):
+        """Load the task and goal lists a page at a time and build the indexes."""
+        self.reset_indexes()
+        self.version = self.data_version()
+        row = self.connect().execute(
+            "SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        if row:
+            self.next_id = row[0]
+        self.task_data, self.goal_data = [], []
+        for table, data_list in (('tasks', self.task_data), ('goals', self.goal_data)):
+            # Tasks sort by due date first in case ranks given by processes
+            # sharing the database have crossed
+            order = 'due, rank' if table == 'tasks' else 'rank'
+            for rank, item in self.fetch_items(table, order=order):
+                self.ranks[item.id] = rank
+                data_list.append(item)
+                self.index_item(item)
+
+    def fetch_items(self, table, where='', params=(), order='rank'):
+        """Yield the rank and record of each Task or Goal in a table matching
+        an optional WHERE clause, in list order, a page at a time."""
+        if table == 'tasks':
+            query = 'SELECT id, rank, desc, due, repeat FROM tasks'
+        else:
+            query = 'SELECT id, rank, desc, target, percent FROM goals'
+        cursor = self.connect().execute(query + where + ' ORDER BY ' + order, params)
+        while True:
+            rows = cursor.fetchmany(SQLITE_PAGE_SIZE)
+            if not rows:
+                return
+            subs, tags = self.fetch_details([row[0] for row in rows])
+            for item_id, rank, desc, value, other_value in rows:
+                if table == 'tasks':
+                    item = Task(desc, value, json.loads(other_value), item_id=item_id)
+                else:
+                    item = Goal(desc, value, other_value, item_id=item_id)
+                item.subs = subs.get(item_id, ())
+                item.tags = tags.get(item_id, ())
+                yield rank, item
+
+    def fetch_details(self, item_ids):
+        """Return the Subitems and tags of a page of Tasks or Goals, by ID."""
+        marks = ', '.join('?' * len(item_ids))
+        subs, tags = {}, {}
+        for parent, text, done, sub_id, due in self.connection.execute(
+                'SELECT parent, text, done, id, due FROM subitems WHERE parent IN ({}) '
+                'ORDER BY parent, position'.format(marks), item_ids):
+            subs.setdefault(parent, []).append(SubItem(text, bool(done), sub_id, due))
+        for item_id, tag in self.connection.execute(
+                'SELECT item, tag FROM tags WHERE item IN ({}) '
+                'ORDER BY item, position'.format(marks), item_ids):
+            tags.setdefault(item_id, []).append(tag)
+        return subs, tags
+
+    def tasks_due(self, start=None, end=None):
+        """Yield the list position and record of each Task due from the start
+        date up to, but not including, the end date, read from the database a
+        page at a time."""
+        if self.pending_statements:
+            # The database doesn't hold the unsaved changes yet, but the lists do
+            yield from super().tasks_due(start, end)
+            return
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('due >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('due < ?')
+            params.append(end)
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        # Tasks are ranked in due date order, so the list position of the
+        # first is the number due before it and the due date index gives the order
+        first = 0
+        if start is not None:
+            first, = self.connect().execute(
+                'SELECT COUNT(*) FROM tasks WHERE due < ?', (start,)).fetchone()
+        tasks = self.fetch_items('tasks', where, params, order='due, rank')
+        for position, (rank, task) in enumerate(tasks, first):
+            yield position, task
+
+    def tagged_ids(self, tag):
+        """Return the IDs of the Tasks and Goals with a tag, read from the database."""
+        if self.pending_statements:
+            return super().tagged_ids(tag)
+        return {item_id for item_id, in self.connect().execute(
+            'SELECT item FROM tags WHERE tag = ?', (tag,))}
+
+    def record_change(self, *change):
+        """Queue the statements writing a change to the rows it affects, to be
+        run on the next save."""
+        action = change[0]
+        if action == 'insert':
+            data_list = self.task_data if change[1] == 'task' else self.goal_data
+            self.write_item(change[3], self.new_rank(data_list, change[2]))
+        elif action == 'merge':
+            data_list = self.task_data if change[1] == 'task' else self.goal_data
+            # Ranked together afterwards as neighbours may be new too
+            for _, item in change[2]:
+                self.write_item(item, 0.0)
+            self.rerank(data_list, {item.id for _, item in change[2]})
+        elif action == 'remove':
+            self.delete_rows(change[1])
+        elif action == 'clear':
+            table = 'tasks' if change[1] == 'task' else 'goals'
+            for details in ('subitems WHERE parent', 'tags WHERE item'):
+                self.queue('DELETE FROM {} IN (SELECT id FROM {})'.format(details, table))
+            self.queue('DELETE FROM ' + table)
+        elif action == 'update':
+            self.update_row(*change[1:])
+        elif action == 'reschedule':
+            for task_id, new_date in change[1]:
+                if new_date is None:
+                    self.delete_rows(task_id)
+                else:
+                    self.queue('UPDATE tasks SET due = ? WHERE id = ?', (new_date, task_id))
+            self.rerank(self.task_data, {task_id for task_id, new_date in change[1]
+                                         if new_date is not None})
+
+    def new_rank(self, data_list, position):
+        """Return the rank for an item inserted at a position in its list."""
+        before = after = None
+        if position > 0:
+            before = self.ranks[data_list[position - 1].id]
+        if position + 1 < len(data_list):
+            after = self.ranks[data_list[position + 1].id]
+        if before is None:
+            return 0.0 if after is None else after - 1
+        if after is None:
+            return before + 1
+        rank = (before + after) / 2
+        if before < rank < after:
+            return rank
+        # Repeated insertions at one place have used up the room between the
+        # neighbouring ranks, so space the whole list out again
+        self.respace(data_list)
+        return float(position)
+
+    def rerank(self, data_list, moved_ids):
+        """Rank items moved within a list, spreading each run of them evenly
+        between the ranks of the items either side."""
+        table = 'tasks' if data_list is self.task_data else 'goals'
+        updates = []
+        position = 0
+        while position < len(data_list):
+            if data_list[position].id not in moved_ids:
+                position += 1
+                continue
+            end = position
+            while end < len(data_list) and data_list[end].id in moved_ids:
+                end += 1
+            before = self.ranks[data_list[position - 1].id] if position else None
+            after = self.ranks[data_list[end].id] if end < len(data_list) else None
+            if before is None:
+                before = -1.0 if after is None else after - (end - position + 1)
+            if after is None:
+                after = before + (end - position + 1)
+            step = (after - before) / (end - position + 1)
+            ranks = [before + step * offset for offset in range(1, end - position + 1)]
+            if not before < ranks[0] or not ranks[-1] < after or len(set(ranks)) < len(ranks):
+                return self.respace(data_list)
+            updates.extend(zip(ranks, (item.id for item in data_list[position:end])))
+            position = end
+
+        for rank, item_id in updates:
+            self.ranks[item_id] = rank
+        self.queue('UPDATE {} SET rank = ? WHERE id = ?'.format(table), updates, many=True)
+
+    def respace(self, data_list):
+        """Rank every item in a list evenly by its position."""
+        table = 'tasks' if data_list is self.task_data else 'goals'
+        for new_rank, item in enumerate(data_list):
+            if item.id in self.ranks:
+                self.ranks[item.id] = float(new_rank)
+                self.queue('UPDATE {} SET rank = ? WHERE id = ?'.format(table),
+                           (float(new_rank), item.id))
+
+    def write_item(self, item, rank):
+        """Insert the rows for a Task or Goal along with its Subitems and tags."""
+        self.ranks[item.id] = rank
+        if type(item) is Task:
+            self.queue('INSERT INTO tasks VALUES (?, ?, ?, ?, ?)',
+                       (item.id, rank, item.desc, item.due, json.dumps(item.repeat)))
+        else:
+            self.queue('INSERT INTO goals VALUES (?, ?, ?, ?, ?)',
+                       (item.id, rank, item.desc, item.target, item.percent))
+        self.write_subs(item)
+        self.write_tags(item)
+
+    def write_subs(self, item):
+        """Replace the Subitem rows of a Task or Goal."""
+        self.queue('DELETE FROM subitems WHERE parent = ?', (item.id,))
+        self.queue('INSERT INTO subitems VALUES (?, ?, ?, ?, ?, ?)',
+                   [(sub.id, item.id, position, sub.text, sub.done, sub.due)
+                    for position, sub in enumerate(item.subs)], many=True)
+
+    def write_tags(self, item):
+        """Replace the tag rows of a Task or Goal."""
+        self.queue('DELETE FROM tags WHERE item = ?', (item.id,))
+        self.queue('INSERT INTO tags VALUES (?, ?, ?)',
+                   [(item.id, position, tag) for position, tag in enumerate(item.tags)],
+                   many=True)
+
+    def delete_rows(self, item_id):
+        """Delete the rows for a Task or Goal along with its Subitems and tags."""
+        del self.ranks[item_id]
+        for table, column in (('tasks', 'id'), ('goals', 'id'),
+                              ('subitems', 'parent'), ('tags', 'item')):
+            self.queue('DELETE FROM {} WHERE {} = ?'.format(table, column), (item_id,))
+
+    def update_row(self, record_id, value_name, value):
+        """Write a changed value of a Task, Goal or Subitem to its row."""
+        record = self.item_index[record_id]
+        if type(record) is SubItem:
+            table = 'subitems'
+        elif value_name == 'subs':
+            return self.write_subs(record)
+        elif value_name == 'tags':
+            return self.write_tags(record)
+        elif type(record) is Task:
+            table = 'tasks'
+            if value_name == 'repeat':
+                value = json.dumps(value)
+        else:
+            table = 'goals'
+        self.queue('UPDATE {} SET {} = ? WHERE id = ?'.format(table, value_name),
+                   (value, record_id))
+
+    def queue(self, statement, values=(), many=False):
+        """Queue a statement to be run with its values on the next save, or
+        run once for each set of values when many is set."""
+        self.pending_statements.append((statement, values, many))
+
+    def save_changes(self):
+        """Run the statements queued since the last save in one transaction.
+
+        If the database stays locked by another process the statements are
+        kept for the next save and sqlite3.OperationalError is raised.
+        """
+        # SQLite doesn't report what it writes so only the history and archive
+        # are counted
+        self.bytes_written += self.history.save() + self.archive.save()
+        if not self.pending_statements or 'next_id' not in vars(self):
+            return
+        connection = self.connect()
+        try:
+            for statement, values, many in self.pending_statements:
+                if many:
+                    connection.executemany(statement, values)
+                else:
+                    connection.execute(statement, values)
+            # Never lowered, in case another process has given out more IDs since
+            connection.execute("INSERT INTO meta VALUES ('next_id', ?) ON CONFLICT (key) "
+                               "DO UPDATE SET value = MAX(value, excluded.value)",
+                               (self.next_id,))
+            connection.commit()
+        except sqlite3.OperationalError:
+            connection.rollback()
+            raise
+        self.pending_statements.clear()
+
+    def discard_changes(self):
+        """Drop the statements queued since the last save."""
+        self.pending_statements.clear()
+        self.ranks = {}
+
+    def new_id(self):
+        """Return an ID that no process sharing the database has given out,
+        reserving a block of them in the database when the last runs out."""
+        if self.next_id >= self.reserved_id:
+            connection = self.connect()
+            # Committed straight away so no lock is held until the next save
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO meta VALUES ('next_id', 1)")
+                stored, = connection.execute(
+                    "SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+                self.next_id = max(self.next_id, stored)
+                self.reserved_id = self.next_id + SQLITE_ID_BLOCK
+                connection.execute("UPDATE meta SET value = ? WHERE key = 'next_id'",
+                                   (self.reserved_id,))
+        return super().new_id()
+
+    def data_version(self):
+        """Return SQLite's version of the database, which only changes when
+        another connection commits to it."""
+        return self.connect().execute('PRAGMA data_version').fetchone()[0]
+
+    def saved_elsewhere(self):
+        """Return whether another process has committed to the database since
+        the data was loaded."""
+        return self.data_version() != self.version
+
+    def has_unsaved_changes(self):
+        """Return whether statements are waiting to be run on the next save."""
+        return bool(self.pending_statements)
+
+
+def open_store(data_file):
+    """Return the Store for a data file, using SQLite for .db and .sqlite files."""
+    if os.path.splitext(data_file)[1] in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteStore(data_file)
+    return PickleStore(data_file)
+
+
+def migrate_to_sqlite(source, db_file):
+    """Copy every Task and Goal from a Store into a new SQLite database."""
+    if os.path.exists(db_file):
+        raise FileExistsError(db_file)
+    target = SqliteStore(db_file)
+    target.load_data()
+    for data_list, target_list in ((source.task_data, target.task_data),
+                                   (source.goal_data, target.goal_data)):
+        for item in data_list:
+            target.insert_item(target_list, len(target_list), item)
+    target.next_id = source.next_id
+    target.history.undo_log = source.history.undo_log
+    target.history.redo_log = source.history.redo_log
+    target.history.compact()
+    target.save_changes()
+    return target
+
+
+class History:
+    """The undo and redo logs for completions and deletions, kept in a
+    history file between sessions.
+
+    Each entry pairs the kind of command with the changes it made, which
+    hold removed Tasks and Goals whole, with the date completed ones were
+    archived, but only the IDs, due dates and reset Subtasks of repeating
+    Tasks that were moved on. Entries beyond the
+    capacity of a log are dropped, oldest first.
+
+    The history file holds both logs as they were when it was last written
+    out, followed by a record of each command recorded, undone or redone
+    since, so saving only appends those and entries are never edited in place. It's written out afresh once as
+    many entries have been dropped from it as a log can hold.
+    """
+
+    def __init__(self, history_file, capacity=None):
+        self.history_file = history_file
+        self.capacity = capacity
+        # Pickled records waiting to be appended to the history file
+        self.pending = []
+        # Entries dropped and records made since the history file was written out
+        self.stale_entries = 0
+
+    def __getattr__(self, name):
+        if name not in ('undo_log', 'redo_log') or 'undo_log' in vars(self):
+            raise AttributeError(name)
+        self.undo_log, self.redo_log = [], []
+        if os.path.exists(self.history_file):
+            history_size = os.path.getsize(self.history_file)
+            with open(self.history_file, 'rb') as fp:
+                self.undo_log, self.redo_log = load_record(fp)
+                while fp.tell() < history_size:
+                    try:
+                        record = load_record(fp)
+                    except (EOFError, pickle.UnpicklingError):
+                        # Partially written record from an interrupted save
+                        break
+                    try:
+                        self.apply(record)
+                    except IndexError:
+                        # Undone by another process sharing the history file first
+                        pass
+        return getattr(self, name)
+
+    def record(self, kind, changes):
+        """Log the changes made by a command, forgetting any undone entries of
+        the same kind as they can no longer be redone."""
+        self.log(('record', kind, changes))
+
+    def undo(self, kind):
+        """Move the latest entry of a kind to the redo log, returning its changes."""
+        return self.log(('undo', kind))
+
+    def redo(self, kind):
+        """Move the latest undone entry of a kind back to the undo log,
+        returning its changes."""
+        return self.log(('redo', kind))
+
+    def revise(self, kind, changes):
+        """Replace the changes of the latest entry of a kind in the undo log,
+        as redoing them found the items changed since they were undone."""
+        self.log(('revise', kind, changes))
+
+    def remap(self, new_ids):
+        """Give the items the logs refer to the new IDs a merge gave them in
+        place of ones another process had given out too."""
+        for log in (self.undo_log, self.redo_log):
+            log[:] = [(kind, [remap_change(change, new_ids) for change in changes])
+                      for kind, changes in log]
+        # Only records not yet saved can refer to items that hadn't been
+        records = [pickle.loads(record) for record in self.pending]
+        self.pending = [pickle.dumps(record[:2] + ([remap_change(change, new_ids)
+                                                    for change in record[2]],)
+                                     if len(record) > 2 else record,
+                                     pickle.HIGHEST_PROTOCOL)
+                        for record in records]
+
+    def log(self, record):
+        """Make the change a record describes and queue the record to be
+        appended to the history file, returning the changes of its entry."""
+        changes = self.apply(record)
+        self.pending.append(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+        return changes
+
+    def apply(self, record):
+        """Make the change a history file record describes, returning the
+        changes of the entry it adds or moves."""
+        kind = record[1]
+        if record[0] == 'record':
+            changes = record[2]
+            self.add_entry(self.undo_log, kind, changes)
+            redo_entries = len(self.redo_log)
+            self.redo_log[:] = [entry for entry in self.redo_log if entry[0] != kind]
+            self.stale_entries += redo_entries - len(self.redo_log)
+        elif record[0] == 'undo':
+            changes = self.take_entry(self.undo_log, kind)
+            self.add_entry(self.redo_log, kind, changes)
+        elif record[0] == 'revise':
+            changes = record[2]
+            self.take_entry(self.undo_log, kind)
+            self.add_entry(self.undo_log, kind, changes)
+        else:
+            changes = self.take_entry(self.redo_log, kind)
+            self.add_entry(self.undo_log, kind, changes)
+        return changes
+
+    def add_entry(self, log, kind, changes):
+        """Append an entry to a log, dropping the oldest if it's full."""
+        log.append((kind, changes))
+        # A capacity of 0 keeps nothing, turning the history off
+        dropped = max(len(log) - self.log_capacity(), 0)
+        del log[:dropped]
+        self.stale_entries += dropped
+
+    def take_entry(self, log, kind):
+        """Remove and return the changes of the latest entry of a kind in a log."""
+        for position in range(len(log) - 1, -1, -1):
+            if log[position][0] == kind:
+                # The record moving it is appended, leaving one more to replay
+                self.stale_entries += 1
+                return log.pop(position)[1]
+        raise IndexError(kind)
+
+    def log_capacity(self):
+        """Return the number of entries each log keeps."""
+        return HISTORY_SIZE if self.capacity is None else self.capacity
+
+    def save(self):
+        """Append the queued records to the history file, or write the logs
+        out afresh if enough has been dropped from it, returning the number
+        of bytes written."""
+        if not self.pending:
+            return 0
+        if self.stale_entries > self.log_capacity() or not os.path.exists(self.history_file):
+            return self.compact()
+        history_data = b''.join(self.pending)
+        with open(self.history_file, 'ab') as fp:
+            fp.write(history_data)
+        self.pending.clear()
+        return len(history_data)
+
+    def compact(self):
+        """Write the logs to the history file in place of its records,
+        returning the number of bytes written."""
+        temp_file = self.history_file + '.tmp'
+        with open(temp_file, 'wb') as fp:
+            pickle.dump((self.undo_log, self.redo_log), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, self.history_file)
+        self.pending.clear()
+        self.stale_entries = 0
+        return os.path.getsize(self.history_file)
+
+
+class Archive:
+    """Completed Tasks and Goals, kept out of the data file in a segment for
+    each month of completion that is only read when it's asked for.
+
+    Segments are only ever appended to, so a restored item isn't removed
+    from its segment but has a record added after it saying so.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        # Pickled records waiting to be appended to each segment, by month
+        self.pending = {}
+
+    def segment_file(self, month):
+        """Return the segment file for a month given as YYYY-MM."""
+        return os.path.join(self.archive_dir, month + '.pickle')
+
+    def months(self):
+        """Return every month with a segment, oldest first."""
+        months = set(self.pending)
+        if os.path.isdir(self.archive_dir):
+            months.update(os.path.splitext(name)[0] for name in os.listdir(self.archive_dir)
+                          if name.endswith('.pickle'))
+        return sorted(months)
+
+    def add(self, item):
+        """Archive a Task or Goal completed today."""
+        self.append(format_date(current_date)[:7], ('archived', current_date, item))
+
+    def restore(self, item_id, month=None):
+        """Mark an archived item as restored, searching back from the latest
+        month when its month isn't given."""
+        self.restore_many([item_id], month)
+
+    def restore_many(self, item_ids, month=None):
+        """Mark archived items as restored, reading each segment at most once
+        and searching back from the latest month when their month isn't given."""
+        remaining = set(item_ids)
+        for month in [month] if month else reversed(self.months()):
+            found = remaining.intersection(item.id for _, item in self.month_items(month))
+            for item_id in item_ids:
+                if item_id in found:
+                    self.append(month, ('restored', item_id))
+            remaining -= found
+            if not remaining:
+                return
+
+    def remap(self, new_ids):
+        """Give the items queued to be archived or restored the new IDs a
+        merge gave them in place of ones another process had given out too."""
+        for month, records in self.pending.items():
+            remapped = []
+            for record in map(pickle.loads, records):
+                if record[0] == 'archived':
+                    remap_change(('remove', record[2]), new_ids)
+                else:
+                    record = ('restored', new_ids.get(record[1], record[1]))
+                remapped.append(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+            records[:] = remapped
+
+    def append(self, month, record):
+        """Queue a record to be appended to a month's segment on the next save."""
+        # Pickled straight away so later in place edits can't alter the record
+        self.pending.setdefault(month, []).append(
+            pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+
+    def month_items(self, month):
+        """Return the completion date and record of each item archived in a
+        month and not since restored, in the order they were archived."""
+        records = []
+        segment_file = self.segment_file(month)
+        if os.path.exists(segment_file):
+            segment_size = os.path.getsize(segment_file)
+            with open(segment_file, 'rb') as fp:
+                try:
+                    while fp.tell() < segment_size:
+                        records.append(load_record(fp))
+                except (EOFError, pickle.UnpicklingError):
+                    # Partially written record from an interrupted save
+                    pass
+        records.extend(pickle.loads(record) for record in self.pending.get(month, ()))
+        archived = {}
+        for record in records:
+            if record[0] == 'archived':
+                archived[record[2].id] = record[1:]
+            else:
+                archived.pop(record[1], None)
+        return list(archived.values())
+
+    def save(self):
+        """Append the queued records to their segments, returning the number
+        of bytes written."""
+        written = 0
+        if self.pending:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        for month, records in self.pending.items():
+            segment_data = b''.join(records)
+            with open(self.segment_file(month), 'ab') as fp:
+                fp.write(segment_data)
+            written += len(segment_data)
+        self.pending.clear()
+        return written
+
+
+class RecordUnpickler(pickle.Unpickler):
+    """Unpickler that finds the record classes in this module whether it was
+    run as a script or imported when the data was saved."""
+
+    def find_class(self, module, name):
+        if name in ('Task', 'Goal', 'SubItem'):
+            return globals()[name]
+        return super().find_class(module, name)
+
+
+def load_record(fp):
+    """Unpickle the next record from a data, journal or index file."""
+    return RecordUnpickler(fp).load()
+
+
+def remap_change(change, new_ids):
+    """Return a history change with the items it refers to given the new IDs
+    a merge gave them, changing removed items in place."""
+    if change[0] == 'remove':
+        for record in [change[1]] + list(change[1].subs):
+            record.id = new_ids.get(record.id, record.id)
+        return change
+    action, task_id, old_due, new_due, sub_ids = change
+    return (action, new_ids.get(task_id, task_id), old_due, new_due,
+            [new_ids.get(sub_id, sub_id) for sub_id in sub_ids])
+
+
+def list_key(value_name, element):
+    """Return what identifies a Subitem or tag in a list of them."""
+    return element.id if value_name == 'subs' else element
+
+
+def merge_list(base, ours, theirs, key):
+    """Return a list of Subitems or tags saved by another process with the
+    changes made here from the keys of the list both started from applied.
+
+    Elements removed here are dropped, those added here are placed after
+    the element before them here, and if the elements were moved here the
+    ones both lists hold take their order from this one.
+    """
+    base_keys = set(base)
+    our_keys = {key(element) for element in ours}
+    merged = [element for element in theirs
+              if key(element) in our_keys or key(element) not in base_keys]
+    kept = [key(element) for element in ours if key(element) in base_keys]
+    if kept != [element for element in base if element in our_keys]:
+        # The other process's copies are kept, as it may have edited them
+        shared = {key(element): element for element in merged if key(element) in kept}
+        moved = iter([shared[element] for element in kept if element in shared])
+        merged = [next(moved) if key(element) in shared else element for element in merged]
+    previous = None
+    for element in ours:
+        merged_keys = [key(merged_element) for merged_element in merged]
+        if key(element) not in base_keys and key(element) not in merged_keys:
+            position = merged_keys.index(previous) + 1 if previous in merged_keys else 0
+            merged.insert(position, element)
+            merged_keys.insert(position, key(element))
+        if key(element) in merged_keys:
+            previous = key(element)
+    return merged
+
+
+def item_words(item):
+    """Return the search weight of each word of a Task or Goal."""
+    words = {}
+    # Words in the description count for more than those in Subitems
+    for word in WORD_REGEX.findall(item.desc.lower()):
+        words[word] = words.get(word, 0) + 2
+    for sub in item.subs:
+        for word in WORD_REGEX.findall(sub.text.lower()):
+            words[word] = words.get(word, 0) + 1
+    return words
+
+
+def pack_tasks(tasks):
+    """Pack the Tasks into columns for a compact data file snapshot."""
+    columns = {
+        'desc': [task.desc for task in tasks],
+        'due': array('l', [task.due for task in tasks]),
+        'id': array('l', [task.id for task in tasks]),
+        # Most Tasks have no repeat, Subtasks or tags so these are sparse
+        'repeat': {},
+        'subs': {},
+        'tags': {},
+    }
+    for num, task in enumerate(tasks):
+        if task.repeat != '':
+            columns['repeat'][num] = task.repeat
+        if task.subs:
+            # Due dates are only packed for the Subtasks that have one
+            columns['subs'][num] = [(sub.text, sub.done, sub.id) if sub.due is None
+                                    else (sub.text, sub.done, sub.id, sub.due)
+                                    for sub in task.subs]
+        if task.tags:
+            columns['tags'][num] = task.tags
+    return columns
+
+
+def unpack_tasks(columns):
+    """Rebuild the list of Tasks from a columnar data file snapshot."""
+    # Columnar data files written before IDs have no ID column
+    item_ids = columns.get('id', [None] * len(columns['desc']))
+    tasks = [Task(desc, due, item_id=item_id) for desc, due, item_id
+             in zip(columns['desc'], columns['due'], item_ids)]
+    for num, repeat in columns['repeat'].items():
+        tasks[num].repeat = repeat
+    for num, subs in columns['subs'].items():
+        tasks[num].subs = [SubItem(*sub) for sub in subs]
+    for num, tags in columns['tags'].items():
+        tasks[num].tags = tags
+    return tasks
 
 
 # MISC FUNTIONS
 
+class CommandStats:
+    """How long each command run this session took, split into parsing it,
+    changing the data, rendering displays and saving, along with the bytes
+    saved and the peak memory use when tracemalloc is tracing."""
+
+    TIMES = ('total', 'parse', 'mutate', 'render', 'save')
+
+    def __init__(self):
+        self.records = []
+        self.current = None
+        self.started = None
+
+    def start(self, command):
+        """Begin recording a command."""
+        self.current = dict.fromkeys(self.TIMES, 0.0)
+        self.current.update(command=command, bytes=0, peak_memory=None)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+
+    def add(self, name, amount):
+        """Add time or bytes to the command being recorded, if there is one."""
+        if self.current is not None:
+            self.current[name] += amount
+
+    def finish(self):
+        """Finish recording a command, counting the time not spent parsing,
+        rendering or saving as time spent changing the data."""
+        record, self.current = self.current, None
+        record['total'] = time.perf_counter() - self.started
+        record['mutate'] = (record['total'] - record['parse'] - record['render']
+                            - record['save'])
+        if tracemalloc.is_tracing():
+            record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        self.records.append(record)
+
+    def summary(self):
+        """Return the average times, total bytes and highest peak memory of
+        each kind of command, by the command's first word."""
+        kinds = {}
+        for record in self.records:
+            name = record['command'].split(' ', 1)[0].lower()
+            kinds.setdefault(name, []).append(record)
+        summary = []
+        for name, records in sorted(kinds.items()):
+            runs = {time_name: sum(record[time_name] for record in records) / len(records)
+                    for time_name in self.TIMES}
+            runs['runs'] = len(records)
+            runs['bytes'] = sum(record['bytes'] for record in records)
+            peaks = [record['peak_memory'] for record in records
+                     if record['peak_memory'] is not None]
+            runs['peak_memory'] = max(peaks) if peaks else None
+            summary.append((name, runs))
+        return summary
+
+    def dump(self, stats_file):
+        """Write every command's record and the summary to a JSON file."""
+        with open(stats_file, 'w') as fp:
+            json.dump({'commands': self.records, 'summary': dict(self.summary())},
+                      fp, indent=2)
+
+
+def run_command(command, save=True):
+    """Run a command, or a chain of them separated by ';', and save the
+    changes made unless a transaction is open, recording its stats."""
+    commands = [chained.strip() for chained in CHAIN_REGEX.findall(command)
+                if chained.strip()]
+    command_stats.start(command)
+    try:
+        # Pick up changes saved by other processes sharing the data file
+        if not transaction_open:
+            store.refresh()
+        if len(commands) > 1:
+            changed = run_chain(commands, save)
+        else:
+            changed = decide_action(commands[0] if commands else command)
+        # Changes a locked database kept from being saved are tried again
+        if (changed or store.has_unsaved_changes()) and save and not transaction_open:
+            started, written = time.perf_counter(), store.bytes_written
+            save_data()
+            command_stats.add('save', time.perf_counter() - started)
+            command_stats.add('bytes', store.bytes_written - written)
+    finally:
+        command_stats.finish()
+
+
+def save_data():
+    """Save the changes made, returning whether they were saved.
+
+    An SQLite database kept locked by another process for longer than
+    SQLite waits is reported rather than raised, with the changes kept to
+    be saved after the next command.
+    """
+    try:
+        store.save_changes()
+    except sqlite3.OperationalError:
+        print("  The Data File Is Busy So the Changes Weren't Saved Yet - "
+              "They'll Be Saved After the Next Command.")
+        return False
+    return True
+
+
+def run_chain(commands, save=True):
+    """Run a chain of commands as one, showing the widest of the displays
+    they refresh once at the end, and returning whether any can have changed
+    the data.
+
+    If one of them fails everything since the last save is rolled back.
+    When saving after each command that's the start of the chain, as the
+    changes before it are saved first, or of the transaction when one is
+    open. The server and batches saving every few commands save later, so
+    earlier unsaved changes are rolled back with the chain.
+    """
+    global deferred_refreshes, transaction_open
+    for command in commands:
+        if COMMAND_REGEX.match(command).group(1).lower() not in COMMANDS:
+            print("  Command Not Recognised: '{}' - None of the Chain Was Run.".format(command))
+            return False
+
+    if save and not transaction_open and not save_data():
+        return False
+    deferred_refreshes = []
+    changed = False
+    try:
+        for command in commands:
+            changed = decide_action(command) or changed
+    except Exception:
+        transaction_open = False
+        store.rollback()
+        print("  '{}' Failed So the Changes Were Rolled Back.".format(command))
+        raise
+    finally:
+        refreshes, deferred_refreshes = deferred_refreshes, None
+
+    for refresh in refreshes:
+        # Shown by a wider display refreshed for another of the commands
+        if WIDER_REFRESHES.get(refresh) not in refreshes:
+            refresh()
+    return changed
+
+
+def profile_session(session, report_file):
+    """Run a session under cProfile and write a report of where the time went."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(session)
+    finally:
+        with open(report_file, 'w') as fp:
+            report = pstats.Stats(profiler, stream=fp)
+            report.strip_dirs()
+            fp.write("Sorted by cumulative time\n")
+            report.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            fp.write("Sorted by time spent in each function itself\n")
+            report.sort_stats('tottime').print_stats(PROFILE_LINES)
+
+
+@functools.lru_cache(maxsize=1024)
 def strike_text(text):
-    """Add a strikethtough effect to text."""
-    striked = ''
-    for char in text:
-        striked = striked + char + '\u0336'
-    return striked
+    """Add a strikethtough effect to text, remembering recent results."""
+    return ''.join(char + '\u0336' for char in text)
 
 
 def show_help():
@@ -1009,11 +3053,236 @@ def show_help():
     print("  Full Documentation can be found at: https://todoian.readthedocs.io/en/latest/")
 
 
-def save_changes():
-    """Write changes to data file."""
-    with open ('data.pickle', 'wb') as fp:
-        pickle.dump(task_data, fp)
-        pickle.dump(goal_data, fp)
+def run_batch(command_file, save_every=0):
+    """Run the commands in a file without displaying the lists, saving once
+    at the end or after every save_every commands."""
+    global show_displays
+    show_displays = False
+    commands = command_file.read().splitlines()
+    # Commands missing arguments fail instead of prompting for them
+    sys.stdin = io.StringIO()
+    commands_run = 0
+    for line_num, command in enumerate(commands, 1):
+        command = command.strip()
+        if not command or command.startswith('#'):
+            continue
+        commands_run += 1
+        try:
+            run_command(command, save=bool(save_every) and commands_run % save_every == 0)
+        except (IndexError, ValueError, AttributeError, EOFError, sqlite3.OperationalError):
+            print("  Line {}: Could Not Run '{}'".format(line_num, command),
+                  file=sys.stderr)
+    if transaction_open:
+        print("  Transaction Left Open at the End of the File Was Rolled Back",
+              file=sys.stderr)
+        rollback_transaction()
+    save_data()
+
+
+def run_interactive():
+    """Show the lists and run commands from the prompt until 'q' is entered."""
+    # Initial display
+    if store.goal_data:
+        view_goals()
+    smart_display(mini=True)
+
+    while True:
+        print()
+        action = input("  ENTER COMMAND ('q' to quit): ")
+        print()
+        if action.lower() == "q":
+            if transaction_open:
+                print("  Uncommitted Changes Discarded.")
+            break
+        else:
+            try:
+                run_command(action)
+
+            except IndexError:
+                print()
+                input("  No Item Found at That Position in the List or Cache - "
+                      "Try Again or Enter 'h' for Usage Instructions.")
+                print()
+
+            except ValueError:
+                print()
+                input("  Did You Forget A Number For The Item/Subitem in Your Command? - "
+                      "Try Again or Enter 'h' for Usage Instructions.")
+                print()
+
+            except sqlite3.OperationalError:
+                print("  The Data File Is Busy - Try Again in a Moment.")
+
+
+class CommandServer:
+    """Runs commands sent over a Unix socket against the data kept loaded in
+    memory, replying with whatever they print.
+
+    Each client sends one command, or chain of them, on a line of its own
+    and gets its output back before the connection is closed. Commands are
+    run one at a time in the order they arrive. Their changes are saved
+    once SERVER_SAVE_DELAY seconds pass without another, but never left
+    unsaved longer than SERVER_SAVE_MAX_DELAY.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        # The save waiting to be made, and when the oldest change it saves was made
+        self.save_handle = None
+        self.unsaved_since = None
+
+    async def serve(self):
+        """Accept clients until interrupted, then save and remove the socket."""
+        try:
+            _, writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError:
+            pass
+        else:
+            writer.close()
+            print("  A Todoian Server Is Already Running on {}.".format(self.socket_path))
+            return
+        # Loaded now rather than while the first client waits
+        store.task_data
+        server = await asyncio.start_unix_server(self.handle_client, self.socket_path)
+        # Only the user running the server can send it commands
+        os.chmod(self.socket_path, 0o600)
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        print("  Serving {} on {} - Press Ctrl-C to Stop.".format(store.data_file,
+                                                               self.socket_path))
+        try:
+            async with server:
+                await stopping.wait()
+        finally:
+            if transaction_open:
+                print("  Uncommitted Changes Discarded.")
+            self.save()
+            os.remove(self.socket_path)
+
+    async def handle_client(self, reader, writer):
+        """Run the command a client sends and reply with its output."""
+        try:
+            command = (await reader.readline()).decode(errors='replace').strip()
+            writer.write(self.run(command).encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def run(self, command):
+        """Run a command, returning what it printed, and schedule a save of
+        any changes it made."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            try:
+                run_command(command, save=False)
+            except (IndexError, ValueError, AttributeError, EOFError):
+                print("  Could Not Run '{}'".format(command))
+            except sqlite3.OperationalError:
+                print("  The Data File Is Busy - Try Again in a Moment.")
+        if store.has_unsaved_changes():
+            self.schedule_save()
+        return output.getvalue()
+
+    def schedule_save(self):
+        """Put off saving until the changes stop coming, or the oldest unsaved
+        one has waited as long as it's allowed to."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.unsaved_since is None:
+            self.unsaved_since = now
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+        self.save_handle = loop.call_at(
+            min(now + SERVER_SAVE_DELAY, self.unsaved_since + SERVER_SAVE_MAX_DELAY),
+            self.save)
+
+    def save(self):
+        """Save the changes clients have made, unless a transaction is open."""
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+            self.save_handle = None
+        self.unsaved_since = None
+        if not transaction_open and not save_data():
+            self.schedule_save()
+
+
+def run_server(socket_path):
+    """Keep the data loaded and run the commands sent to a Unix socket until
+    interrupted."""
+    # Commands missing arguments fail instead of prompting for them
+    sys.stdin = io.StringIO()
+    asyncio.run(CommandServer(socket_path).serve())
+
+
+def main():
+    """Run Todoian from the command line."""
+    global store, use_pager, FONT_DICT
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', metavar='FILE', default=DATA_FILE,
+                        help="the data file to use, SQLite for .db and .sqlite files "
+                             "(default: %(default)s)")
+    parser.add_argument('--migrate', metavar='DB',
+                        help="copy the data file into a new SQLite database DB and exit")
+    parser.add_argument('--batch', metavar='FILE', type=argparse.FileType('r'),
+                        help="run the commands in FILE ('-' for stdin) and exit")
+    parser.add_argument('--save-every', metavar='N', type=int, default=0,
+                        help="save after every N batch commands rather than once at the end")
+    parser.add_argument('--serve', action='store_true',
+                        help="keep the data loaded and run commands sent by todoian_client.py "
+                             "until interrupted")
+    parser.add_argument('--socket', metavar='FILE',
+                        help="the socket --serve listens on (default: the data file's name "
+                             "ending in .sock)")
+    parser.add_argument('--plain', action='store_true',
+                        help="display without colours or underlining, for piping")
+    parser.add_argument('--no-pager', action='store_true',
+                        help="never page displays that don't fit on screen")
+    parser.add_argument('--history', metavar='N', type=int, default=HISTORY_SIZE,
+                        help="commands kept to be undone or redone (default: %(default)s)")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile the session with cProfile and write a report to FILE")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="record each command's peak memory use in the stats")
+    parser.add_argument('--plugin', metavar='FILE', action='append', default=[],
+                        help="run FILE before starting so it can register commands; "
+                             "can be given more than once")
+    args = parser.parse_args()
+    store = open_store(args.data)
+    store.history.capacity = args.history
+    if args.migrate:
+        try:
+            migrate_to_sqlite(store, args.migrate)
+        except FileExistsError:
+            print("  {} Already Exists.".format(args.migrate))
+            return
+        print("  Data Copied to {}. Use '--data {}' to Use It.".format(
+            args.migrate, args.migrate))
+        return
+    use_pager = not args.no_pager
+    if args.plain:
+        FONT_DICT = dict.fromkeys(FONT_DICT, '')
+    if args.trace_memory:
+        tracemalloc.start()
+    # Plugins that import todoian get this module even when it's run as a script
+    sys.modules.setdefault('todoian', sys.modules[__name__])
+    for plugin in args.plugin:
+        runpy.run_path(plugin)
+
+    if args.batch:
+        session = functools.partial(run_batch, args.batch, args.save_every)
+    elif args.serve:
+        socket_path = args.socket or os.path.splitext(args.data)[0] + '.sock'
+        session = functools.partial(run_server, socket_path)
+    else:
+        session = run_interactive
+    if args.profile:
+        profile_session(session, args.profile)
+    else:
+        session()
 
 
 # A dictionary of ANSI escapse sequences for font effects.
@@ -1031,44 +3300,174 @@ FONT_DICT = {
 # List of three-letter day names used to check repeat input
 DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
 
-with open('data.pickle', 'rb') as fp:
-    task_data = pickle.load(fp)
-    goal_data = pickle.load(fp)
-
-# Cache Lists
-deleted_tasks = []
-completed_tasks = []
-deleted_goals = []
-completed_goals = []
-
-# Formatted then stripped to set unwanted hours etc to blank for comparisons
-current_datetime = dt.strptime(dt.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
-current_date = current_datetime.strftime('%Y-%m-%d')
-
-# Initial display
-if goal_data:
-    view_goals()
-smart_display(mini=True)
-
-while True:
-    print()
-    action = input("  ENTER COMMAND ('q' to quit): ")
-    print()
-    if action.lower() == "q":
-        break
-    else:
-        try:
-            decide_action(action)
-            save_changes()
-
-        except IndexError:
-            print()
-            input("  No Item Found at That Position in the List or Cache - "
-                  "Try Again or Enter 'h' for Usage Instructions.")
-            print()
-
-        except ValueError:
-            print()
-            input("  Did You Forget A Number For The Item/Subitem in Your Command? - "
-                  "Try Again or Enter 'h' for Usage Instructions.")
-            print()
+# Splits descriptions and searches into the words used by the search index
+WORD_REGEX = re.compile(r'\w+')
+
+# Argument grammars, compiled once rather than on every command
+# The commands chained on one line by ';', leaving any inside quotes alone
+CHAIN_REGEX = re.compile(r'(?:[^;"]|"[^"]*"?)+')
+# A command's name and the text after it
+COMMAND_REGEX = re.compile(r'^([-\w]*)\s?(.*)')
+# An item number followed by whatever the command needs
+ITEM_REGEX = re.compile(r'^(\w*)\s?(.*)?')
+# An item number and Subitem number followed by whatever the command needs
+SUBITEM_REGEX = re.compile(r'^(\d*)\s(\d*)\s?(.*)?')
+SUBITEM_MOVE_REGEX = re.compile(r'^(\d*)\s(\d*)\s?(\d*)?')
+MOVE_REGEX = re.compile(r'^(\d*)\s?(\d*)?')
+TAG_ADD_REGEX = re.compile(r'^(\d*)\s?(.*)?')
+# A quoted description, then a due date and repeat or a quoted target and percentage
+TASK_ADD_REGEX = re.compile(r'^"(.*)"\s?(\S*)?\s?(.*)?')
+GOAL_ADD_REGEX = re.compile(r'^"(.*)"\s?"?([^"]*)?"?\s?(.*)?')
+
+# The columns of exported files, which JSON Lines files leave out when empty
+EXPORT_FIELDS = ('type', 'desc', 'due', 'repeat', 'target', 'percent', 'done', 'tags')
+# Skipped lines reported by an import, with the rest only counted
+IMPORT_PROBLEMS_SHOWN = 10
+
+# A repeat every number of months, with the day of the month it falls on
+MONTHLY_REGEX = re.compile(r'^(\d+)m(?::(\d+))?$')
+
+# A month of the archive, as YYYY-MM
+MONTH_REGEX = re.compile(r'^\d{4}-\d{2}$')
+
+# The default data file and the thresholds at which the journal is compacted
+DATA_FILE = 'data.pickle'
+JOURNAL_MAX_BYTES = 256 * 1024
+JOURNAL_MAX_AGE = 24 * 60 * 60
+# Seconds the server waits for changes to stop coming before saving them,
+# and the longest it leaves any change unsaved
+SERVER_SAVE_DELAY = 2
+SERVER_SAVE_MAX_DELAY = 30
+# Task lists at least this long are saved in the more compact columnar format
+COLUMNAR_MIN_TASKS = 10000
+
+# Tables for SQLite data files, which keep items in list order by their rank
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY, rank REAL, desc TEXT, due INTEGER, repeat TEXT);
+CREATE TABLE IF NOT EXISTS goals (
+    id INTEGER PRIMARY KEY, rank REAL, desc TEXT, target TEXT, percent TEXT);
+CREATE TABLE IF NOT EXISTS subitems (
+    id INTEGER PRIMARY KEY, parent INTEGER, position INTEGER, text TEXT, done INTEGER,
+    due INTEGER);
+CREATE TABLE IF NOT EXISTS tags (item INTEGER, position INTEGER, tag TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due, rank);
+CREATE INDEX IF NOT EXISTS goals_rank ON goals (rank);
+CREATE INDEX IF NOT EXISTS subitems_parent ON subitems (parent, position);
+CREATE INDEX IF NOT EXISTS tags_item ON tags (item, position);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+'''
+# Rows read from SQLite data files at a time
+SQLITE_PAGE_SIZE = 500
+# IDs reserved from SQLite data files at a time
+SQLITE_ID_BLOCK = 100
+# Commands kept in each of the undo and redo logs
+HISTORY_SIZE = 100
+# Functions listed in each ordering of a --profile report
+PROFILE_LINES = 40
+
+# The commands decide_action runs, by alias
+COMMANDS = {}
+show_subgoals = functools.partial(view_goals, show_subs=True)
+mini_display = functools.partial(smart_display, mini=True)
+# The display showing everything another does, for chains refreshing both
+WIDER_REFRESHES = {mini_display: smart_display, view_goals: show_subgoals}
+register_command(('ls', 'list'), list_command, mutates=False)
+register_command(('fd', 'find', 'search'), view_search, mutates=False)
+register_command(('vg', 'view-goal'), view_goal_command, mutates=False)
+register_command(('vt', 'view-tags'), view_tags_command, target='task', mutates=False)
+register_command(('vgt', 'view-goal-tags'), view_tags_command, target='goal', mutates=False)
+register_command(('stats',), stats_command, arg='raw', mutates=False)
+register_command(('h', 'help'), show_help, arg=None, mutates=False)
+register_command(('export',), export_data, arg='raw', mutates=False)
+register_command(('import',), import_data, arg='raw', refresh=smart_display)
+register_command(('begin',), begin_transaction, arg=None, mutates=False)
+register_command(('commit',), commit_transaction, arg=None, mutates=False)
+register_command(('rollback',), rollback_transaction, arg=None, mutates=False,
+                 refresh=smart_display)
+
+register_command(('a', 'add', 'add-task'), add_task, arg='raw', refresh=smart_display)
+register_command(('d', 'del', 'delete'), delete_command, target='task', refresh=smart_display)
+register_command(('c', 'complete'), complete_command, refresh=smart_display)
+register_command(('e', 'ed', 'edit'), edit_desc, arg='raw', target='task',
+                 refresh=smart_display)
+register_command(('cd', 'change-date'), change_date, refresh=smart_display)
+register_command(('ar', 'add-repeat'), add_repeat, arg='raw')
+register_command(('rr', 'remove-repeat'), remove_repeat_command)
+register_command(('mv', 'm', 'move'), move_item, target='task', refresh=smart_display)
+register_command(('at', 'add-tag'), add_tag, arg='raw', target='task', refresh=mini_display)
+register_command(('rt', 'remove-tag'), remove_tag, target='task')
+register_command(('u', 'undo'), functools.partial(undo_action, 'deleted-tasks'), arg=None,
+                 refresh=smart_display)
+register_command(('uc', 'uncheck'), functools.partial(undo_action, 'completed-tasks'),
+                 arg=None, refresh=smart_display)
+register_command(('rd', 'redo'), functools.partial(redo_action, 'deleted-tasks'), arg=None,
+                 refresh=smart_display)
+register_command(('rc', 'recheck'), functools.partial(redo_action, 'completed-tasks'),
+                 arg=None, refresh=smart_display)
+register_command(('rs', 'restore'), restore_archived, refresh=smart_display)
+
+register_command(('s', 'subtask'), add_sub, arg='raw', target='task', refresh=smart_display)
+register_command(('cs', 'comp-subtask'), complete_sub, target='task', refresh=smart_display)
+register_command(('us', 'uncomp-subtask'), uncomplete_sub, target='task',
+                 refresh=smart_display)
+register_command(('ds', 'delete-subtask'), delete_sub, target='task', refresh=smart_display)
+register_command(('es', 'edit-subtask'), edit_sub, arg='raw', target='task',
+                 refresh=smart_display)
+register_command(('ms', 'move-subtask'), move_sub, target='task', refresh=smart_display)
+register_command(('sd', 'subtask-date'), date_sub, target='task', refresh=smart_display)
+
+register_command(('g', 'ag', 'add-goal'), add_goal, arg='raw', refresh=view_goals)
+register_command(('dg', 'delg', 'delete-goal'), delete_command, target='goal',
+                 refresh=view_goals)
+register_command(('cg', 'complete-goal'), complete_goal_command, refresh=view_goals)
+register_command(('eg', 'edg', 'edit-goal'), edit_desc, arg='raw', target='goal',
+                 refresh=view_goals)
+register_command(('ct', 'change-target'), change_target, arg='raw', refresh=view_goals)
+register_command(('cp', 'change-percentage'), change_percentage, refresh=view_goals)
+register_command(('mvg', 'mg', 'move-goal'), move_item, target='goal', refresh=view_goals)
+register_command(('agt', 'add-goal-tag'), add_tag, arg='raw', target='goal',
+                 refresh=mini_display)
+register_command(('rgt', 'remove-goal-tag'), remove_tag, target='goal')
+register_command(('ug', 'undo-goal'), functools.partial(undo_action, 'deleted-goals'),
+                 arg=None, refresh=view_goals)
+register_command(('ucg', 'uncheck-goal'), functools.partial(undo_action, 'completed-goals'),
+                 arg=None, refresh=view_goals)
+register_command(('rdg', 'redo-goal'), functools.partial(redo_action, 'deleted-goals'),
+                 arg=None, refresh=view_goals)
+register_command(('rcg', 'recheck-goal'), functools.partial(redo_action, 'completed-goals'),
+                 arg=None, refresh=view_goals)
+
+register_command(('sg', 'subgoal'), add_sub, arg='raw', target='goal', refresh=show_subgoals)
+register_command(('csg', 'complete-subgoal'), complete_sub, target='goal',
+                 refresh=show_subgoals)
+register_command(('usg', 'uncomp-subgoal'), uncomplete_sub, target='goal',
+                 refresh=show_subgoals)
+register_command(('dsg', 'delete-subgoal'), delete_sub, target='goal', refresh=show_subgoals)
+register_command(('esg', 'edit-subgoal'), edit_sub, arg='raw', target='goal',
+                 refresh=show_subgoals)
+register_command(('msg', 'move-subgoal'), move_sub, target='goal', refresh=show_subgoals)
+register_command(('sgd', 'subgoal-date'), date_sub, target='goal', refresh=show_subgoals)
+
+# The data everything works on, loaded when first used
+store = open_store(DATA_FILE)
+
+# Due dates are stored and compared as ordinals
+current_date = dt.now().toordinal()
+
+# Whether commands redisplay the lists they change
+show_displays = True
+# Collects the output of the outermost display function being run
+render_buffer = None
+# Whether displays that don't fit on screen are shown through a pager
+use_pager = True
+# Timings of the commands run this session
+command_stats = CommandStats()
+# Whether saves are held back until 'commit' or 'rollback'
+transaction_open = False
+# The displays to show once a chain of commands has run, while one is running
+deferred_refreshes = None
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Send a command to a running Todoian server and print what it shows.
+
+Start the server with 'python3 todoian.py --serve' and then run commands
+without waiting for Todoian to start and load its data each time:
+
+    python3 todoian_client.py ls t
+    python3 todoian_client.py 'a "Call the bank" tm'
+"""
+
+# Nothing else is imported so the client starts as quickly as possible
+import sys
+import socket
+
+
+# The socket the server listens on by default
+SOCKET_FILE = 'data.sock'
+
+
+def send_command(command, socket_path=SOCKET_FILE):
+    """Send a command to the server and return its output."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(command.replace('\n', ' ').encode() + b'\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks).decode()
+
+
+def main():
+    """Send the command given on the command line."""
+    args = sys.argv[1:]
+    socket_path = SOCKET_FILE
+    if args[:1] == ['--socket'] and len(args) > 1:
+        socket_path, args = args[1], args[2:]
+    if not args:
+        print("usage: todoian_client.py [--socket FILE] COMMAND...", file=sys.stderr)
+        sys.exit(2)
+    try:
+        output = send_command(' '.join(args), socket_path)
+    except OSError:
+        print("  No Todoian Server Is Running on {} - Start One With "
+              "'python3 todoian.py --serve'.".format(socket_path), file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(output)
+
+
+if __name__ == '__main__':
+    main()